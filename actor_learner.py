@@ -0,0 +1,178 @@
+import queue
+import random
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.optim as optim
+from agent import DQNAgent
+from checkpoint import CheckpointWriter, make_checkpoint
+from environment import OkeyEnvironment
+from model import DQNetwork
+from nstep import nstep_records
+from pretrain import pretrain_agent
+from replay_buffer import pack_transitions
+from telemetry import Telemetry
+from traces import TraceWriter
+from train import make_replay_buffer, learn
+from utils import preprocess_state
+
+
+def rollout_worker(worker_id, seed, config, shared_model, weights_lock, weights_version, epsilon,
+                   episode_queue, stop_event):
+    # Plays episodes with an epsilon-greedy copy of the learner's network and ships them as packed records
+    torch.set_num_threads(1)
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    env = OkeyEnvironment()
+    agent = DQNAgent(env.state_size, env.action_size, config)
+    local_version = -1
+
+    while not stop_event.is_set():
+        if weights_version.value != local_version:
+            with weights_lock:
+                agent.model.load_state_dict(shared_model.state_dict())
+                local_version = weights_version.value
+        agent.epsilon = epsilon.value
+
+        states, actions, rewards, next_states, dones, next_masks = [], [], [], [], [], []
+        state = preprocess_state(env.reset())
+        valid_mask = env.valid_action_mask()
+        for t in range(config.max_steps_per_episode):
+            action = agent.act(state, valid_mask)
+            next_state, reward, done = env.step(action)
+            next_state = preprocess_state(next_state)
+            next_mask = env.valid_action_mask()
+            states.append(state)
+            actions.append(action)
+            rewards.append(reward)
+            next_states.append(next_state)
+            dones.append(done)
+            next_masks.append(next_mask)
+            state, valid_mask = next_state, next_mask
+            if done:
+                break
+
+        records = nstep_records(pack_transitions(np.stack(states), actions, rewards, np.stack(next_states), dones,
+                                                 np.stack(next_masks)), config.n_step, config.gamma)
+        while not stop_event.is_set():
+            try:
+                episode_queue.put((worker_id, records, env.played_deal(), actions, rewards), timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+
+def train_agent_distributed(env, agent, config):
+    # config.num_workers rollout processes feed a single learner that owns the model and the replay buffer
+    replay_buffer = make_replay_buffer(config)
+    optimizer = optim.Adam(agent.model.parameters(), lr=config.learning_rate)
+    criterion = torch.nn.MSELoss()
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=1, gamma=config.lr_decay)
+    if config.pretrain:
+        pretrain_agent(agent, replay_buffer, optimizer, config)
+    trace_writer = TraceWriter(config.trace_path) if config.trace_path else None
+    checkpoint_writer = CheckpointWriter(config.checkpoint_dir, config.checkpoint_keep) \
+        if config.checkpoint_interval else None
+
+    ctx = mp.get_context('spawn')
+    shared_model = DQNetwork(agent.state_size, agent.action_size)
+    shared_model.load_state_dict(agent.model.state_dict())
+    shared_model.share_memory()
+    weights_lock = ctx.Lock()
+    weights_version = ctx.Value('i', 0)
+    epsilon = ctx.Value('d', agent.epsilon)
+    episode_queue = ctx.Queue(maxsize=config.worker_queue_size)
+    stop_event = ctx.Event()
+
+    base_seed = random.randrange(2**31)
+    workers = [
+        ctx.Process(target=rollout_worker, daemon=True,
+                    args=(i, base_seed + i, config, shared_model, weights_lock, weights_version, epsilon,
+                          episode_queue, stop_event))
+        for i in range(config.num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    scores = []
+    telemetry = Telemetry(config, ('queue', 'buffer_add', 'sample', 'replay', 'weight_sync'))
+    env_steps = 0
+    updates = 0
+    start_time = time.perf_counter()
+
+    try:
+        while len(scores) < config.num_episodes:
+            # Wait only while there is nothing to learn from, then take at most one episode per worker
+            # between updates so a full queue cannot starve the learner
+            for _ in range(config.num_workers):
+                if len(scores) >= config.num_episodes:
+                    break
+                clock = telemetry.clock()
+                try:
+                    if len(replay_buffer) <= config.batch_size:
+                        _, records, deal, actions, rewards = episode_queue.get(timeout=1.0)
+                    else:
+                        _, records, deal, actions, rewards = episode_queue.get_nowait()
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("All rollout workers exited")
+                    break
+                clock = telemetry.lap('queue', clock)
+                replay_buffer.add_records(records)
+                telemetry.lap('buffer_add', clock)
+                telemetry.count('env_steps', len(records))
+                env_steps += len(records)
+                episode = len(scores)
+                telemetry.begin_episode(episode)
+                total_reward = sum(rewards)
+                scores.append(total_reward)
+                if trace_writer is not None:
+                    trace_writer.add_episode(deal, actions, rewards)
+
+                if episode % config.target_update == 0:
+                    agent.update_target_network()
+                if agent.epsilon > agent.epsilon_min:
+                    agent.epsilon *= agent.epsilon_decay
+                epsilon.value = agent.epsilon
+                if updates > 0:
+                    scheduler.step()  # Only once updates have started, as in train_agent
+
+                telemetry.gauge('epsilon', agent.epsilon)
+                telemetry.gauge('loss', agent.last_loss)
+                telemetry.gauge('buffer_fill', len(replay_buffer) / config.buffer_size)
+                telemetry.end_episode(episode, total_reward)
+
+                if checkpoint_writer is not None and (episode + 1) % config.checkpoint_interval == 0:
+                    trace_position = trace_writer.tell() if trace_writer is not None else None
+                    checkpoint_writer.save(make_checkpoint(agent, optimizer, scheduler, replay_buffer, episode + 1,
+                                                           scores, config.checkpoint_replay_buffer, trace_position))
+
+            if len(replay_buffer) > config.batch_size:
+                learn(agent, replay_buffer, optimizer, criterion, config, telemetry)
+                updates += 1
+                if updates % config.weight_sync_interval == 0:
+                    clock = telemetry.clock()
+                    with weights_lock:
+                        shared_model.load_state_dict(agent.model.state_dict())
+                        weights_version.value += 1
+                    telemetry.lap('weight_sync', clock)
+        elapsed = time.perf_counter() - start_time
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        telemetry.close(len(scores) - 1)
+        replay_buffer.flush()
+        if trace_writer is not None:
+            trace_writer.close()
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()
+
+    torch.save(agent.model.state_dict(), config.model_save_path)
+    print(f"Average reward: {np.mean(scores)}")
+    print(f"Env steps/s: {env_steps / elapsed:.0f}, updates/s: {updates / elapsed:.0f} "
+          f"with {config.num_workers} workers")
+    return scores
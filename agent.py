@@ -1,7 +1,8 @@
+import numpy as np
 import torch
 import torch.nn.functional as F
 from model import DQNetwork
-import random
+from symmetry import canonicalize, canonicalize_minibatch, from_canonical_actions
 
 class DQNAgent:
     def __init__(self, state_size, action_size, config):
@@ -12,28 +13,58 @@ class DQNAgent:
         self.epsilon = config.epsilon_start
         self.epsilon_decay = config.epsilon_decay
         self.epsilon_min = config.epsilon_min
+        self.batched_replay = config.batched_replay
+        self.canonical_colors = config.canonical_colors
+        self.gamma = config.gamma
+        self.last_loss = None
 
     def act(self, state, valid_actions):
-        if random.random() <= self.epsilon:
-            return random.choice(valid_actions)
-        state = torch.tensor(state, dtype=torch.float).unsqueeze(0)
-        with torch.no_grad():
-            q_values = self.model(state)
-        q_values = q_values.squeeze().cpu().numpy()
+        # valid_actions: list of action indices or a boolean mask of shape (action_size,)
+        if isinstance(valid_actions, np.ndarray) and valid_actions.dtype == bool:
+            valid_mask = valid_actions
+        else:
+            valid_mask = np.zeros(self.action_size, dtype=bool)
+            valid_mask[valid_actions] = True
+        return int(self.act_batch(np.asarray(state)[None], valid_mask[None])[0])
+
+    def act_batch(self, states, valid_masks):
+        # Epsilon-greedy over the legal actions of every state, states (N, state_size), valid_masks (N, action_size)
+        if not self.canonical_colors:
+            return self._epsilon_greedy(states, valid_masks)
+        # The network sees canonical colours, its actions are mapped back to the caller's colours
+        states, valid_masks, order = canonicalize(states, valid_masks)
+        return from_canonical_actions(self._epsilon_greedy(states, valid_masks), order)
+
+    def _epsilon_greedy(self, states, valid_masks):
+        valid_masks = torch.as_tensor(valid_masks, dtype=torch.bool)
+        explore = torch.rand(len(valid_masks)) <= self.epsilon
+        if explore.all():
+            actions = torch.zeros(len(valid_masks), dtype=torch.long)
+        else:
+            with torch.no_grad():
+                q_values = self.model(torch.as_tensor(states, dtype=torch.float))
+            actions = q_values.masked_fill(~valid_masks, float('-inf')).argmax(dim=1)
+        if explore.any():
+            # Uniform choice among the legal actions of the exploring rows
+            actions[explore] = torch.multinomial(valid_masks[explore].float(), 1).squeeze(1)
+        return actions.numpy()
 
-        # Only consider valid actions
-        valid_q_values = [(i, q_values[i]) for i in valid_actions]
-        action = max(valid_q_values, key=lambda x: x[1])[0]
-        return action
+    def replay(self, minibatch, optimizer, criterion, weights=None):
+        # Minibatch of stacked (states, actions, rewards, next_states, dones, next_valid_masks, steps) tensors,
+        # the batched path returns the absolute TD errors for prioritized replay. An n-step transition
+        # bootstraps from next_state with gamma ** steps.
+        if self.canonical_colors:
+            minibatch = self.canonical_minibatch(minibatch)
+        if self.batched_replay:
+            return self.replay_batched(minibatch, optimizer, criterion, weights)
 
-    def replay(self, minibatch, optimizer, criterion):
-        for state, action, reward, next_state, done in minibatch:
+        for state, action, reward, next_state, done, _, steps in zip(*minibatch):
             target = reward
             if not done:
-                next_state = torch.tensor(next_state, dtype=torch.float).unsqueeze(0)
-                target = reward + 0.99 * torch.max(self.target_model(next_state))
+                next_state = next_state.unsqueeze(0)
+                target = reward + self.gamma ** steps * torch.max(self.target_model(next_state))
 
-            state = torch.tensor(state, dtype=torch.float).unsqueeze(0)
+            state = state.unsqueeze(0)
             target_f = self.model(state)
             target_f[0][action] = target
 
@@ -42,5 +73,53 @@ class DQNAgent:
             loss.backward()
             optimizer.step()
 
+    def replay_batched(self, minibatch, optimizer, criterion, weights=None):
+        states, actions, rewards, next_states, dones, next_masks, steps = minibatch
+
+        # Max-Q targets over the legal next actions only, one target network pass
+        with torch.no_grad():
+            next_q = self.target_model(next_states).masked_fill(~next_masks, float('-inf')).max(dim=1).values
+            targets = rewards + self.gamma ** steps * torch.where(dones, torch.zeros_like(next_q), next_q)
+
+        q_values = self.model(states).gather(1, actions.unsqueeze(1)).squeeze(1)
+        if weights is None:
+            loss = criterion(q_values, targets)
+        else:
+            # Importance-sampling weighted squared error
+            loss = (weights * (q_values - targets) ** 2).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        self.last_loss = loss.item()
+        return (q_values.detach() - targets).abs().numpy()
+
+    def replay_expert(self, minibatch, optimizer, margin):
+        # Update on demonstration transitions: the TD loss of replay_batched plus a large-margin loss
+        # that is zero only once the demonstrated action leads every other action by margin
+        if self.canonical_colors:
+            minibatch = self.canonical_minibatch(minibatch)
+        states, actions, rewards, next_states, dones, next_masks, steps = minibatch
+        with torch.no_grad():
+            next_q = self.target_model(next_states).masked_fill(~next_masks, float('-inf')).max(dim=1).values
+            targets = rewards + self.gamma ** steps * torch.where(dones, torch.zeros_like(next_q), next_q)
+
+        all_q_values = self.model(states)
+        q_values = all_q_values.gather(1, actions.unsqueeze(1)).squeeze(1)
+        margins = torch.full_like(all_q_values, margin).scatter_(1, actions.unsqueeze(1), 0.0)
+        margin_loss = ((all_q_values + margins).max(dim=1).values - q_values).mean()
+        loss = F.mse_loss(q_values, targets) + margin_loss
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        self.last_loss = loss.item()
+
+    def canonical_minibatch(self, minibatch):
+        # States and actions in the colour frames act_batch uses, see symmetry.canonicalize_minibatch
+        states, actions, rewards, next_states, dones, next_masks, steps = minibatch
+        states, actions, next_states, next_masks = canonicalize_minibatch(
+            states.numpy(), actions.numpy(), next_states.numpy(), next_masks.numpy())
+        return (torch.from_numpy(states), torch.from_numpy(actions), rewards, torch.from_numpy(next_states), dones,
+                torch.from_numpy(next_masks), steps)
+
     def update_target_network(self):
         self.target_model.load_state_dict(self.model.state_dict())
@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+import numpy as np
+import torch
+from agent import DQNAgent
+from benchmarks.common import measure_latency, measure_rate
+from config import Config
+from environment import OkeyEnvironment
+from replay_buffer import ReplayBuffer, MemmapReplayBuffer, PrioritizedReplayBuffer
+from vector_environment import VectorOkeyEnvironment
+
+
+def _collect_states(count):
+    env = OkeyEnvironment()
+    states, valid_actions = [], []
+    state = env.reset()
+    while len(states) < count:
+        valid = env.get_valid_actions()
+        states.append(state)
+        valid_actions.append(valid)
+        state, _, done = env.step(random.choice(valid))
+        if done:
+            state = env.reset()
+    return states, valid_actions
+
+
+def bench_agent_act(quick):
+    # Greedy single-state inference, the per-move cost of play.py and rollouts
+    agent = DQNAgent(72, 44, Config())
+    agent.epsilon = 0.0
+    states, valid_actions = _collect_states(256)
+    calls = iter(range(10**9))
+
+    def act():
+        i = next(calls) % len(states)
+        agent.act(states[i], valid_actions[i])
+
+    result = {'actions_per_s': measure_rate(act, quick)}
+    result.update(measure_latency(act, quick))
+    return result
+
+
+def bench_agent_act_batch(quick, num_envs=256):
+    # Greedy batched selection for a VectorOkeyEnvironment rollout
+    agent = DQNAgent(72, 44, Config())
+    agent.epsilon = 0.0
+    env = VectorOkeyEnvironment(num_envs, seed=0)
+    states = env.reset()
+
+    def act():
+        nonlocal states
+        states, _, _ = env.step(agent.act_batch(states, env.valid_action_mask()))
+
+    return {'actions_per_s': measure_rate(act, quick, work_per_call=num_envs)}
+
+
+def _filled_buffer(buffer, size):
+    rng = np.random.default_rng(0)
+    states = rng.random((size, 72)) < 0.3
+    buffer.add_batch(states, rng.integers(0, 44, size), rng.integers(0, 10, size) * 10, states,
+                     rng.random(size) < 0.05, rng.random((size, 44)) < 0.3)
+    return buffer
+
+
+def bench_agent_replay(quick):
+    config = Config()
+    agent = DQNAgent(72, 44, config)
+    optimizer = torch.optim.Adam(agent.model.parameters(), lr=config.learning_rate)
+    criterion = torch.nn.MSELoss()
+    buffer = _filled_buffer(ReplayBuffer(10000), 10000)
+    return {'updates_per_s': measure_rate(
+        lambda: agent.replay(buffer.sample(config.batch_size), optimizer, criterion), quick)}
+
+
+def bench_replay_sample(quick):
+    # Sampling at the buffer_size used for training
+    config = Config()
+    uniform = _filled_buffer(ReplayBuffer(config.buffer_size), config.buffer_size)
+    prioritized = _filled_buffer(PrioritizedReplayBuffer(config.buffer_size), config.buffer_size)
+    prioritized.update_priorities(np.arange(config.buffer_size), np.random.default_rng(0).random(config.buffer_size))
+    result = {
+        'uniform_batches_per_s': measure_rate(lambda: uniform.sample(config.batch_size), quick),
+        'prioritized_batches_per_s': measure_rate(lambda: prioritized.sample(config.batch_size), quick),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        memmap = _filled_buffer(MemmapReplayBuffer(config.buffer_size, os.path.join(directory, 'replay.mm')),
+                                config.buffer_size)
+        result['memmap_batches_per_s'] = measure_rate(lambda: memmap.sample(config.batch_size), quick)
+        del memmap
+    return result
+
+
+BENCHMARKS = {
+    'agent_act': bench_agent_act,
+    'agent_act_batch': bench_agent_act_batch,
+    'agent_replay': bench_agent_replay,
+    'replay_sample': bench_replay_sample,
+}
@@ -0,0 +1,42 @@
+import random
+import numpy as np
+from benchmarks.common import measure_rate
+from environment import OkeyEnvironment
+from vector_environment import VectorOkeyEnvironment
+
+
+def bench_env_step(quick):
+    env = OkeyEnvironment()
+    env.reset()
+
+    def play_step():
+        _, _, done = env.step(random.choice(env.get_valid_actions()))
+        if done:
+            env.reset()
+
+    return {'steps_per_s': measure_rate(play_step, quick)}
+
+
+def bench_env_valid_actions(quick):
+    env = OkeyEnvironment()
+    env.reset()
+    return {'calls_per_s': measure_rate(env.get_valid_actions, quick)}
+
+
+def bench_vector_env_step(quick, num_envs=1024):
+    env = VectorOkeyEnvironment(num_envs, seed=0)
+    env.reset()
+    rng = np.random.default_rng(0)
+
+    def play_step():
+        mask = env.valid_action_mask()
+        env.step((rng.random(mask.shape) * mask).argmax(axis=1))
+
+    return {'steps_per_s': measure_rate(play_step, quick, work_per_call=num_envs)}
+
+
+BENCHMARKS = {
+    'env_step': bench_env_step,
+    'env_valid_actions': bench_env_valid_actions,
+    'vector_env_step': bench_vector_env_step,
+}
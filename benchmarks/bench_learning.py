@@ -0,0 +1,52 @@
+import contextlib
+import io
+import os
+import tempfile
+import numpy as np
+from agent import DQNAgent
+from benchmarks.common import seed_everything
+from config import Config
+from environment import OkeyEnvironment
+from train import train_agent
+
+TARGET_SCORE = 150  # Rolling mean over the last WINDOW training episodes
+WINDOW = 100
+
+
+def episodes_to_target(scores, target=TARGET_SCORE):
+    # First episode at which the rolling mean reaches target, len(scores) when it never does
+    rolling = np.convolve(scores, np.ones(WINDOW) / WINDOW, 'valid')
+    reached = np.flatnonzero(rolling >= target)
+    return int(reached[0]) + WINDOW if len(reached) else len(scores)
+
+
+def bench_nstep_episodes_to_target(quick):
+    # Sample efficiency of n-step returns, full training runs with Config.n_step 1, 3 and 5
+    num_episodes = 1000 if quick else 3000
+    seeds = (0,) if quick else (0, 1)
+    result = {}
+    for n_step in (1, 3, 5):
+        target_episodes, final_scores = [], []
+        for seed in seeds:
+            seed_everything(seed)
+            config = Config()
+            config.num_episodes = num_episodes
+            config.n_step = n_step
+            config.checkpoint_interval = 0
+            config.metrics_path = None
+            env = OkeyEnvironment()
+            agent = DQNAgent(env.state_size, env.action_size, config)
+            with tempfile.TemporaryDirectory() as directory:
+                config.model_save_path = os.path.join(directory, 'model.pth')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    scores = train_agent(env, agent, config)
+            target_episodes.append(episodes_to_target(scores))
+            final_scores.append(float(np.mean(scores[-WINDOW:])))
+        result[f'n{n_step}_target_episodes'] = float(np.mean(target_episodes))
+        result[f'n{n_step}_final_score'] = float(np.mean(final_scores))
+    return result
+
+
+BENCHMARKS = {
+    'nstep_episodes_to_target': bench_nstep_episodes_to_target,
+}
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import measure_latency
+
+MODEL_PATH = 'dqn_model_v1.pth'
+
+# What play.py does before the first prompt: imports plus loading the model
+NUMPY_STARTUP = (
+    "from environment import OkeyEnvironment\n"
+    "from numpy_policy import load_policy\n"
+    f"load_policy({MODEL_PATH!r})\n"
+)
+TORCH_STARTUP = (
+    "import torch\n"
+    "from agent import DQNAgent\n"
+    "from config import Config\n"
+    "from environment import OkeyEnvironment\n"
+    "agent = DQNAgent(72, 44, Config())\n"
+    f"agent.model.load_state_dict(torch.load({MODEL_PATH!r}))\n"
+)
+
+
+def _cold_start(code, runs):
+    # Best time of a few fresh interpreters in ms, the first one also pays for a cold disk cache, and
+    # the largest peak RSS of the interpreters in MB
+    times, peaks = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', code])
+        _, status, usage = os.wait4(process.pid, 0)
+        times.append(time.perf_counter() - start)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+        peaks.append(usage.ru_maxrss / 1024)  # Kilobytes on Linux
+    return min(times) * 1000, max(peaks)
+
+
+def bench_play_startup(quick):
+    # Memory is measured in the started interpreters, this process only waits for them
+    runs = 2 if quick else 5
+    numpy_ms, numpy_rss = _cold_start(NUMPY_STARTUP, runs)
+    torch_ms, torch_rss = _cold_start(TORCH_STARTUP, runs)
+    return {
+        'numpy_startup_ms': numpy_ms,
+        'torch_startup_ms': torch_ms,
+        'numpy_peak_rss_mb': numpy_rss,
+        'torch_peak_rss_mb': torch_rss,
+        'peak_rss_mb': max(numpy_rss, torch_rss),
+    }
+
+
+def bench_play_move(quick):
+    # Greedy move selection of the trained model, NumPy engine against the torch agent
+    import torch
+    from agent import DQNAgent
+    from benchmarks.bench_agent import _collect_states
+    from config import Config
+    from numpy_policy import load_policy
+    policy = load_policy(MODEL_PATH)
+    agent = DQNAgent(72, 44, Config())
+    agent.model.load_state_dict(torch.load(MODEL_PATH))
+    agent.epsilon = 0.0
+    states, valid_actions = _collect_states(256)
+    calls = iter(range(10**9))
+
+    def numpy_move():
+        i = next(calls) % len(states)
+        policy.act(states[i], valid_actions[i])
+
+    def torch_move():
+        i = next(calls) % len(states)
+        agent.act(states[i], valid_actions[i])
+
+    result = {f'numpy_{name}': value for name, value in measure_latency(numpy_move, quick).items()}
+    result.update({f'torch_{name}': value for name, value in measure_latency(torch_move, quick).items()})
+    return result
+
+
+BENCHMARKS = {
+    'play_startup': bench_play_startup,
+    'play_move': bench_play_move,
+}
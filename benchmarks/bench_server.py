@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+import numpy as np
+from environment import OkeyEnvironment
+from numpy_policy import load_policy
+from server import AdvisoryServer, format_card
+from hand_tables import card_from_index
+
+MODEL_PATH = 'dqn_model_v1.pth'
+
+
+async def _client(port, seed, stop_time, latencies):
+    # One simulated player on its own connection: takes every suggestion and reports the cards it draws
+    # from a local copy of the game
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def request(message):
+        writer.write((json.dumps(message) + '\n').encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    env = OkeyEnvironment(seed=seed)
+    game = 0
+    while time.perf_counter() < stop_time:
+        env.reset()
+        name = f'{seed}-{game}'
+        game += 1
+        await request({'op': 'start', 'game': name, 'hand': [format_card(card) for card in env.hand]})
+        done = False
+        while not done:
+            start = time.perf_counter()
+            action = (await request({'op': 'suggest', 'game': name}))['action']
+            latencies.append(time.perf_counter() - start)
+            num_drawn = len(env.drawn_cards)
+            env.step(action)
+            drawn = [format_card(card_from_index(index)) for index in env.drawn_cards[num_drawn:]]
+            done = (await request({'op': 'play', 'game': name, 'action': action, 'draw': drawn}))['done']
+    writer.close()
+
+
+async def _load_test(policy, num_sessions, seconds, max_batch):
+    server = AdvisoryServer(policy, max_batch=max_batch)
+    tcp_server = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, seed, start + seconds, latencies) for seed in range(num_sessions)))
+    elapsed = time.perf_counter() - start
+    tcp_server.close()
+    await tcp_server.wait_closed()
+    latencies = np.array(latencies)
+    return {
+        'suggestions_per_s': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_batch': server.batcher.num_requests / server.batcher.num_batches,
+    }
+
+
+def bench_server_sessions(quick):
+    # Hundreds of concurrent games against one server in this process, clients included, with
+    # dynamic batching and with one forward pass per suggestion
+    policy = load_policy(MODEL_PATH)
+    seconds = 2.0 if quick else 10.0
+    result = {}
+    for label, max_batch in (('batched', 256), ('unbatched', 1)):
+        metrics = asyncio.run(_load_test(policy, 256, seconds, max_batch))
+        result.update({f'{label}_{name}': value for name, value in metrics.items()})
+    return result
+
+
+BENCHMARKS = {
+    'server_sessions': bench_server_sessions,
+}
@@ -0,0 +1,31 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+from agent import DQNAgent
+from config import Config
+from environment import OkeyEnvironment
+from train import train_agent
+
+
+def bench_train_episode(quick):
+    # Full train_agent episodes with a warm replay buffer, console output discarded
+    config = Config()
+    config.num_episodes = 30 if quick else 200
+    env = OkeyEnvironment()
+    agent = DQNAgent(env.state_size, env.action_size, config)
+    with tempfile.TemporaryDirectory() as directory:
+        config.model_save_path = os.path.join(directory, 'model.pth')
+        config.metrics_path = os.path.join(directory, 'metrics.jsonl')
+        config.checkpoint_interval = 0  # Checkpoint writes are not part of an episode, and would land in the repo
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            scores = train_agent(env, agent, config)
+        elapsed = time.perf_counter() - start
+    return {'episodes_per_s': len(scores) / elapsed}
+
+
+BENCHMARKS = {
+    'train_episode': bench_train_episode,
+}
@@ -0,0 +1,46 @@
+import random
+import resource
+import sys
+import time
+import numpy as np
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].manual_seed(seed)
+
+
+def measure_rate(fn, quick=False, work_per_call=1):
+    # Calls fn for a fixed wall-clock budget, returns work done per second
+    min_seconds = 0.3 if quick else 2.0
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls * work_per_call / elapsed
+
+
+def measure_latency(fn, quick=False, warmup=100):
+    # p50/p99 of single calls in milliseconds
+    calls = 500 if quick else 5000
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter_ns()
+        fn()
+        samples[i] = time.perf_counter_ns() - start
+    return {
+        'p50_ms': float(np.percentile(samples, 50) / 1e6),
+        'p99_ms': float(np.percentile(samples, 99) / 1e6),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
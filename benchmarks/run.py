@@ -0,0 +1,108 @@
+import argparse
+import importlib
+import json
+import multiprocessing as mp
+import platform
+import subprocess
+import sys
+from benchmarks.common import peak_rss_mb, seed_everything
+
+# Benchmark name -> module defining it, imported only in the process that runs it
+BENCHMARKS = {
+    'env_step': 'bench_env',
+    'env_valid_actions': 'bench_env',
+    'vector_env_step': 'bench_env',
+    'agent_act': 'bench_agent',
+    'agent_act_batch': 'bench_agent',
+    'agent_replay': 'bench_agent',
+    'replay_sample': 'bench_agent',
+    'train_episode': 'bench_train',
+    'play_startup': 'bench_play',
+    'play_move': 'bench_play',
+    'server_sessions': 'bench_server',
+    'nstep_episodes_to_target': 'bench_learning',
+}
+
+# Full training runs taking minutes, only run when named
+SLOW_BENCHMARKS = {'nstep_episodes_to_target'}
+
+
+def run_one(name, quick, seed):
+    # Runs in a fresh process so peak RSS belongs to this benchmark alone
+    module = importlib.import_module(f'benchmarks.{BENCHMARKS[name]}')
+    seed_everything(seed)
+    result = module.BENCHMARKS[name](quick)
+    # Benchmarks that do their work in subprocesses report the peak of those processes themselves
+    result.setdefault('peak_rss_mb', peak_rss_mb())
+    return result
+
+
+def lower_is_better(metric):
+    return metric.endswith('_ms') or metric.endswith('_mb') or metric.endswith('_episodes')
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            change = (value - reference) / reference
+            if lower_is_better(metric):
+                change = -change
+            if change < -tolerance:
+                regressions.append(f"{name}.{metric}: {value:.4g} vs baseline {reference:.4g} ({change:+.0%})")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmarks")
+    parser.add_argument('names', nargs='*', help=f"Benchmarks to run: {', '.join(BENCHMARKS)}, all but "
+                                                      f"{', '.join(SLOW_BENCHMARKS)} by default")
+    parser.add_argument('--quick', action='store_true', help="Short runs for a smoke check")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Flag regressions against a stored results file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown")
+    args = parser.parse_args()
+
+    names = args.names or [name for name in BENCHMARKS if name not in SLOW_BENCHMARKS]
+    results = {}
+    ctx = mp.get_context('spawn')
+    for name in names:
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_one, (name, args.quick, args.seed))
+        print(name, json.dumps({metric: round(value, 4) for metric, value in results[name].items()}))
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'quick': args.quick,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
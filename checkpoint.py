@@ -0,0 +1,118 @@
+import copy
+import glob
+import os
+import queue
+import random
+import threading
+import numpy as np
+import torch
+
+# Periodic training checkpoints. The training thread only takes an in-memory snapshot,
+# a background thread writes it to a temporary file and renames it into place, so a
+# crash mid-write never leaves a truncated checkpoint behind.
+
+CHECKPOINT_PATTERN = 'checkpoint_*.pt'
+
+
+def checkpoint_path(directory, episode):
+    return os.path.join(directory, f'checkpoint_{episode:08d}.pt')
+
+
+def list_checkpoints(directory):
+    # Oldest first, the zero padded episode number sorts by name
+    return sorted(glob.glob(os.path.join(directory, CHECKPOINT_PATTERN)))
+
+
+def latest_checkpoint(directory):
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def make_checkpoint(agent, optimizer, scheduler, replay_buffer, episode, scores, include_replay_buffer=True,
+                    trace_position=None):
+    # Copies everything training needs to continue from the start of `episode`. trace_position is the
+    # size of the trace file (TraceWriter.tell) when training records its games
+    checkpoint = {
+        'episode': episode,
+        'scores': list(scores),
+        'model': copy.deepcopy(agent.model.state_dict()),
+        'target_model': copy.deepcopy(agent.target_model.state_dict()),
+        'optimizer': copy.deepcopy(optimizer.state_dict()),
+        'scheduler': scheduler.state_dict(),
+        'epsilon': agent.epsilon,
+        'python_rng': random.getstate(),
+        'numpy_rng': np.random.get_state(),
+        'torch_rng': torch.get_rng_state(),
+    }
+    if include_replay_buffer:
+        checkpoint['replay_buffer'] = replay_buffer.state_dict()
+    if trace_position is not None:
+        checkpoint['trace_position'] = trace_position
+    return checkpoint
+
+
+def restore_checkpoint(checkpoint, agent, optimizer, scheduler, replay_buffer):
+    # Inverse of make_checkpoint, returns the episode to continue from and the scores so far
+    agent.model.load_state_dict(checkpoint['model'])
+    agent.target_model.load_state_dict(checkpoint['target_model'])
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    scheduler.load_state_dict(checkpoint['scheduler'])
+    agent.epsilon = checkpoint['epsilon']
+    random.setstate(checkpoint['python_rng'])
+    np.random.set_state(checkpoint['numpy_rng'])
+    torch.set_rng_state(checkpoint['torch_rng'])
+    if 'replay_buffer' in checkpoint:
+        replay_buffer.load_state_dict(checkpoint['replay_buffer'])
+    return checkpoint['episode'], checkpoint['scores']
+
+
+def load_checkpoint(path):
+    # Checkpoints hold Python and NumPy RNG states, which the weights_only loader rejects
+    return torch.load(path, weights_only=False)
+
+
+class CheckpointWriter:
+    # Writes snapshots on a background thread and keeps the newest keep_last files
+    def __init__(self, directory, keep_last=3):
+        self.directory = directory
+        self.keep_last = keep_last
+        os.makedirs(directory, exist_ok=True)
+        # Training waits only if two snapshots are already pending
+        self.pending = queue.Queue(maxsize=2)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, checkpoint):
+        self._raise_error()
+        self.pending.put(checkpoint)
+
+    def _run(self):
+        while True:
+            checkpoint = self.pending.get()
+            if checkpoint is None:
+                break
+            try:
+                self._write(checkpoint)
+            except Exception as error:
+                self.error = error
+
+    def _write(self, checkpoint):
+        path = checkpoint_path(self.directory, checkpoint['episode'])
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as f:
+            torch.save(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+        for old_path in list_checkpoints(self.directory)[:-self.keep_last]:
+            os.remove(old_path)
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writing a checkpoint to {self.directory} failed") from self.error
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
+        self._raise_error()
@@ -1,3 +1,5 @@
+import os
+
 class Config:
     def __init__(self):
         self.num_episodes = 10000  # TODO This field shall be tuned
@@ -5,8 +7,40 @@ class Config:
         self.buffer_size = 200000  # Replay buffer size
         self.batch_size = 128  # Batch size for replay
         self.learning_rate = 0.00025 # TODO This field shall be tuned
+        self.lr_decay = 1.0  # StepLR gamma, the learning rate is multiplied by it after every training episode # TODO This field shall be tuned
         self.epsilon_start = 1.0
         self.epsilon_decay = 0.9994 # TODO This field shall be tuned
         self.epsilon_min = 0.01
         self.target_update = 800  # TODO This field shall be tuned
+        self.gamma = 0.99  # Discount factor
+        self.n_step = 1  # Steps summed into one transition before bootstrapping, see nstep.py
+        self.batched_replay = True  # One gradient step per minibatch, False for the per-transition loop
+        self.replay_seed = None  # Seed of replay sampling, None draws it from np.random, see replay_buffer.sampling_rng
+        self.replay_memmap_path = None  # File backing an on-disk replay buffer, for buffers larger than RAM
+        self.canonical_colors = False  # The network sees observations in canonical colour order, see symmetry.py
+        self.prioritized_replay = False  # Sum-tree prioritized replay, needs batched_replay
+        self.priority_alpha = 0.6
+        self.priority_beta_start = 0.4  # Importance-sampling exponent, annealed to 1
+        self.priority_beta_steps = 100000  # Updates over which beta reaches 1
+        self.num_workers = 0  # Rollout worker processes, 0 trains in a single process
+        self.worker_queue_size = 256  # Episodes buffered between the workers and the learner
+        self.weight_sync_interval = 100  # Learner updates between weight broadcasts to the workers
+        self.metrics_path = 'training_metrics.jsonl'  # Streamed training metrics, .csv for CSV, None to disable
+        self.metrics_interval = 100  # Episodes aggregated into one metrics record
+        self.console_log_interval = 1  # Metrics records between console lines, 0 to silence them
+        self.profile_episodes = None  # (first, last) episodes to run under cProfile
+        self.profile_path = 'training.prof'  # cProfile stats of profile_episodes, read with pstats
+        self.checkpoint_dir = 'checkpoints'  # Periodic training checkpoints, see checkpoint.py
+        self.checkpoint_interval = 500  # Episodes between checkpoints, 0 to disable
+        self.checkpoint_keep = 3  # Newest checkpoints kept on disk
+        self.checkpoint_replay_buffer = True  # Include the replay buffer contents in checkpoints
+        self.trace_path = None  # Append every training game to this trace file, see traces.py
+        self.pretrain = False  # Warm start from heuristic expert games before training, see pretrain.py
+        self.expert_episodes = 20000  # Heuristic games generated for pretraining
+        self.expert_trace_path = 'expert_games.okt'  # Expert games, generated once and reused
+        self.expert_workers = os.cpu_count()  # Processes generating the expert games
+        self.pretrain_updates = 5000  # Minibatch updates on the expert transitions
+        self.pretrain_target_update = 500  # Pretraining updates between target network syncs
+        self.pretrain_margin = 10.0  # Points by which the expert action should lead the others
+        self.pretrain_epsilon = 0.1  # Exploration rate training starts from after pretraining
         self.model_save_path = 'dqn_model_v1.pth'  # Path to save the trained model
@@ -1,152 +1,165 @@
 import numpy as np
 import random
-from collections import Counter
+from hand_tables import (
+    NUM_CARDS, COMBINATION_NUMBERS, HAND_ROWS, VALID_ACTION_MASKS, COMBINATION_BITS_LIST, REMOVED_CARDS,
+    SAME_NUMBER_OR_COLOR_BITS, card_index, card_from_index, cards_to_mask, mask_to_indices,
+    mask_to_cards, combination_action,
+)
+
+# Offsets of the card states inside the observation, 3 entries per card
+IN_DECK, IN_HAND, DISCARDED = 0, 1, 2
 
 class OkeyEnvironment:
-    def __init__(self):
-        self.deck = self.initialize_deck()
+    def __init__(self, state_dtype=np.float32, seed=None):
         self.state_size = 72  # 3 colors * 8 numbers * 3 states (deck, hand, discarded)
         self.action_size = 44  # 20 combination actions + 24 discard actions
         self.valid_combinations = {}
-        self.discarded = []
         self.dummy_card = (-1, -1)  # Represent an empty slot
+        # The hand and the discarded cards are 24-bit masks, the deck is a list of card indices
+        self.hand_mask = 0
+        self.discarded_mask = 0
+        self.deck_cards = []
+        self.drawn_cards = []  # Card indices in the order they entered the hand, see played_deal
+        # Observation kept up to date in place by every move, get_state hands out copies of it
+        self.state_buffer = np.zeros(self.state_size, dtype=state_dtype)
+        # Deals are shuffled by this instance's own generator when seeded, by the global random module otherwise
+        self.rng = random.Random(seed) if seed is not None else random
+        self.deck = self.initialize_deck()
+
+    # Tuple based views of the game, kept for callers that work with (color, number) cards
+    @property
+    def hand(self):
+        return mask_to_cards(self.hand_mask)
+
+    @hand.setter
+    def hand(self, cards):
+        self.hand_mask = cards_to_mask(cards)
+        self._rebuild_state()
+
+    @property
+    def deck(self):
+        return [card_from_index(index) for index in self.deck_cards]
+
+    @deck.setter
+    def deck(self, cards):
+        self.deck_cards = [card_index(card) for card in cards]
+        self._rebuild_state()
+
+    @property
+    def discarded(self):
+        return mask_to_cards(self.discarded_mask)
+
+    @discarded.setter
+    def discarded(self, cards):
+        self.discarded_mask = cards_to_mask(cards)
+        self._rebuild_state()
 
     def initialize_deck(self):
         deck = []
         for color in range(3):
             for number in range(1, 9):
                 deck.append((color, number))
-        random.shuffle(deck)
+        self.rng.shuffle(deck)
         return deck
 
-    def reset(self):
-        self.deck = self.initialize_deck()
-        self.hand = [self.deck.pop() for _ in range(5)]
-        self.discarded = []
+    def reset(self, deal=None):
+        # deal: optional 24 card indices in deck order, the hand is drawn from the end
+        if deal is None:
+            self.deck_cards = [card_index(card) for card in self.initialize_deck()]
+        else:
+            self.deck_cards = [int(index) for index in deal]
+        self.drawn_cards = []
+        self.hand_mask = 0
+        self.discarded_mask = 0
+        self._rebuild_state()
+        for _ in range(5):
+            self.draw_card()
         return self.get_state()
 
+    def set_hand(self, cards):
+        # Start from a known hand, every other card is unseen and stays in the deck
+        self.hand_mask = cards_to_mask(cards)
+        self.discarded_mask = 0
+        self.deck_cards = [index for index in range(NUM_CARDS) if not self.hand_mask >> index & 1]
+        self.drawn_cards = mask_to_indices(self.hand_mask)
+        self._rebuild_state()
+
+    def draw_card(self, card=None):
+        # Draw the top card of the deck, or a given card when it is known (e.g. in play.py)
+        if card is None:
+            index = self.deck_cards.pop()
+        else:
+            index = card_index(card)
+            self.deck_cards.remove(index)
+        self.hand_mask |= 1 << index
+        self.drawn_cards.append(index)
+        self.state_buffer[3 * index + IN_DECK] = 0
+        self.state_buffer[3 * index + IN_HAND] = 1
+        return card_from_index(index)
+
+    def played_deal(self):
+        # A deal that reset(deal) turns into the same game, also when the cards came from set_hand and draw_card
+        return self.deck_cards + self.drawn_cards[::-1]
+
+    def _rebuild_state(self):
+        # Full re-encode, only needed when the whole game is replaced
+        state = self.state_buffer.reshape(NUM_CARDS, 3)
+        state[:] = 0
+        state[self.deck_cards, IN_DECK] = 1  # Mark cards in the deck
+        state[mask_to_indices(self.hand_mask), IN_HAND] = 1  # Mark cards in the hand
+        state[mask_to_indices(self.discarded_mask), DISCARDED] = 1  # Mark used/discarded cards
+
     def get_state(self):
-        # Encode the current hand and remaining deck into a state tensor
-        state = np.zeros((3, 8, 3))
-        # Mark cards in the hand
-        for card in self.hand:
-            if card != self.dummy_card:
-                color, number = card
-                state[color, number-1, 1] = 1  # Mark card as in hand
-
-        # Mark cards in the deck
-        for card in self.deck:
-            color, number = card
-            state[color, number-1, 0] = 1  # Mark card as in deck
-
-        # Mark used/discarded cards
-        for card in self.discarded:
-            color, number = card
-            state[color, number-1, 2] = 1  # Mark card as discarded
-
-        return state.flatten()  # Flatten for use in the neural network
+        # Flat layout of (3 colors, 8 numbers, 3 states) for the network. A copy, callers keep the
+        # observation of one step next to the one after it
+        return self.state_buffer.copy()
+
+    def valid_action_mask(self):
+        return VALID_ACTION_MASKS[HAND_ROWS[self.hand_mask]].copy()
 
     def get_valid_actions(self):
-        valid_actions = []
-        self.valid_combinations = {}
+        valid_actions = np.flatnonzero(VALID_ACTION_MASKS[HAND_ROWS[self.hand_mask]]).tolist()
 
-        # Check for possible same-number combinations
-        for action, combination in enumerate([
-            (1, 1, 1), (2, 2, 2), (3, 3, 3), (4, 4, 4),
-            (5, 5, 5), (6, 6, 6), (7, 7, 7), (8, 8, 8)
-        ]):
-            success, _ = self.try_combination(*combination, remove=False)
-            if success:
-                valid_actions.append(action)
-                self.valid_combinations[action] = (combination, True)
-
-        # Check for possible same-color sequential combinations
-        for i, combination in enumerate([
-            (1, 2, 3), (2, 3, 4), (3, 4, 5), (4, 5, 6),
-            (5, 6, 7), (6, 7, 8)
-        ]):
-            success, same_color = self.try_combination(*combination, remove=False)
-            if success:
-                if same_color:
-                    valid_actions.append(8 + i)  # Action numbers 8-13 for same-color sequential combinations
-                    self.valid_combinations[8 + i] = (combination, True)
-                else:
-                    valid_actions.append(14 + i)  # Action numbers 14-19 for different-color sequential combinations
-                    self.valid_combinations[14 + i] = (combination, False)
-
-        # Discard actions for specific cards in hand
-        for card in self.hand:
-            if card != self.dummy_card:
-                index = self.get_card_action_index(card)
-                valid_actions.append(index)
+        # Combination actions 0-7 same-number, 8-13 same-color sequential, 14-19 different-color sequential
+        self.valid_combinations = {}
+        for action in valid_actions:
+            if action >= 20:
+                break
+            self.valid_combinations[action] = (COMBINATION_NUMBERS[action], action < 14)
 
         return valid_actions
 
     def get_card_action_index(self, card):
-        color, number = card
-        return 20 + (color * 8) + (number - 1)  # Action numbers 20-43 for discarding cards
-
+        return 20 + card_index(card)  # Action numbers 20-43 for discarding cards
 
+    def combination_cards(self, action):
+        # Cards of the hand used by a valid combination action
+        return mask_to_cards(int(REMOVED_CARDS[HAND_ROWS[self.hand_mask], action]))
 
     def step(self, action):
-        reward = 0
-        hand_before_action = self.hand.copy()
-        if action in range(0, 8):  # Same-number combination
-            combination = self.valid_combinations[action][0]
-            self.remove_combination_cards_from_hand(*combination)
-            reward = self.calculate_reward_for_action(action, same_color=True)
-            # Replace the removed cards if the deck still has enough cards
-            num_cards_to_draw = min(3, len(self.deck))
-            for i in range(len(self.hand)):
-                if self.hand[i] == self.dummy_card and num_cards_to_draw > 0:
-                    new_card = self.deck.pop()
-                    self.hand[i] = new_card
-                    num_cards_to_draw -= 1
-        elif action in range(8, 14):  # Same-color sequential combination
-            combination = self.valid_combinations[action][0]
-            self.remove_combination_cards_from_hand(*combination)
-            reward = self.calculate_reward_for_action(action, same_color=True)
-            # Replace the removed cards if the deck still has enough cards
-            num_cards_to_draw = min(3, len(self.deck))
-            for i in range(len(self.hand)):
-                if self.hand[i] == self.dummy_card and num_cards_to_draw > 0:
-                    new_card = self.deck.pop()
-                    self.hand[i] = new_card
-                    num_cards_to_draw -= 1
-            
-        elif action in range(14, 20):  # Different-color sequential combination
-            combination = self.valid_combinations[action][0]
-            self.remove_combination_cards_from_hand(*combination)
-            reward = self.calculate_reward_for_action(action, same_color=False)
-            # Replace the removed cards if the deck still has enough cards
-            num_cards_to_draw = min(3, len(self.deck))
-            for i in range(len(self.hand)):
-                if self.hand[i] == self.dummy_card and num_cards_to_draw > 0:
-                    new_card = self.deck.pop()
-                    self.hand[i] = new_card
-                    num_cards_to_draw -= 1
-            
-        elif action in range(20, 44):  # Discard action based on specific card
-            card_to_discard = self.get_card_from_action_index(action)
-            index = self.hand.index(card_to_discard)
-            self.hand[index] = self.dummy_card
-            self.discarded.append(card_to_discard)
-            if len(self.deck) > 0:
-                new_card = self.deck.pop()
-                self.hand[index] = new_card
-            reward = 0  # No points for discarding
-        # print(f"Reward: {reward}, Action: {action}, Hand Before: {hand_before_action}, Hand After: {self.hand}")
+        reward = self.apply_action(action)
+        for _ in range(self.cards_to_draw(action)):
+            self.draw_card()
         done = self.check_if_done()
         new_state = self.get_state()
         return new_state, reward, done
 
-    def get_card_from_action_index(self, action):
-        index = action - 20
-        color = index // 8
-        number = (index % 8) + 1
-        return (color, number)
+    def apply_action(self, action):
+        # The move itself without the replacement cards, returns its points
+        if not VALID_ACTION_MASKS[HAND_ROWS[self.hand_mask], action]:
+            raise ValueError(f"Action {action} is not valid for this hand")
+        if action < 20:  # Same-number, same-color or different-color sequential combination
+            self.remove_cards_from_hand(int(REMOVED_CARDS[HAND_ROWS[self.hand_mask], action]))
+            return self.calculate_reward_for_action(action, same_color=action < 14)
+        self.discard_card(self.get_card_from_action_index(action))
+        return 0  # No points for discarding
 
+    def cards_to_draw(self, action):
+        # Removed cards are replaced while the deck lasts, 3 after a combination and 1 after a discard
+        return min(3 if action < 20 else 1, len(self.deck_cards))
 
+    def get_card_from_action_index(self, action):
+        return card_from_index(action - 20)
 
     def calculate_reward_for_action(self, action, same_color):
         if action in range(0, 8):  # For same-number combinations
@@ -158,79 +171,53 @@ class OkeyEnvironment:
         else:
             return 0  # No points for discard actions
 
+    def _combination_for_numbers(self, n1, n2, n3):
+        # Action of a combination given by its numbers, same-color runs are preferred
+        actions = combination_action(n1, n2, n3)
+        if actions is None:
+            return None
+        bits = COMBINATION_BITS_LIST[HAND_ROWS[self.hand_mask]]
+        for action in actions:
+            if bits >> action & 1:
+                return action
+        return None
 
     def try_combination(self, n1, n2, n3, remove=False):
-        hand_numbers = [card[1] for card in self.hand if card != self.dummy_card]
-
-        # Count the occurrences of each number in the hand
-        hand_count = Counter(hand_numbers)
-        required_numbers = [n1, n2, n3]
-        required_count = Counter(required_numbers)
-
-        for num, count in required_count.items():
-            if hand_count[num] < count:
-                return False, False  # Not enough of a specific number in the hand
-
-        # Check for color match or mismatches
-        if n1 != n2 or n2 != n3:
-            indices = []
-            for num in required_numbers:
-                for i, card in enumerate(self.hand):
-                    if card[1] == num and i not in indices and card != self.dummy_card:
-                        indices.append(i)
-                        break
-
-            colors = [self.hand[i][0] for i in indices]
-            if len(set(colors)) == 1:  # All cards are the same color
-                if remove:
-                    self.remove_combination_cards_from_hand(n1, n2, n3)
-                return True, True
-            else:  # Different colors
-                if remove:
-                    self.remove_combination_cards_from_hand(n1, n2, n3)
-                return True, False
-
+        action = self._combination_for_numbers(n1, n2, n3)
+        if action is None:
+            return False, False  # Not enough of a specific number in the hand
         if remove:
             self.remove_combination_cards_from_hand(n1, n2, n3)
-        return True, True
+        return True, action < 14
 
     def remove_combination_cards_from_hand(self, n1, n2, n3):
-        to_remove = [n1, n2, n3]
-        for num in to_remove:
-            for i, card in enumerate(self.hand):
-                if card[1] == num:
-                    self.hand[i] = self.dummy_card
-                    self.discarded.append(card)
-                    break
-    
+        action = self._combination_for_numbers(n1, n2, n3)
+        if action is not None:
+            self.remove_cards_from_hand(int(REMOVED_CARDS[HAND_ROWS[self.hand_mask], action]))
+
+    def remove_cards_from_hand(self, cards_mask):
+        if cards_mask & ~self.hand_mask:
+            raise ValueError(f"{mask_to_cards(cards_mask & ~self.hand_mask)} not in the hand")
+        self.hand_mask &= ~cards_mask
+        self.discarded_mask |= cards_mask
+        for index in mask_to_indices(cards_mask):
+            self.state_buffer[3 * index + IN_HAND] = 0
+            self.state_buffer[3 * index + DISCARDED] = 1
+
+    def discard_card(self, card):
+        self.remove_cards_from_hand(1 << card_index(card))
+
     def check_if_done(self):
-        if len(self.deck) == 0:
+        if len(self.deck_cards) == 0:
             if not self.has_valid_combination():
                 return True
-        if len(self.hand) == 0 or all(card == self.dummy_card for card in self.hand):
+        if self.hand_mask == 0:
             return True
-        if not self.has_valid_combination() and len(self.deck) > 0:
-            return False
-
         return False
 
     def has_valid_combination(self):
-        hand_numbers = [card[1] for card in self.hand if card != self.dummy_card]
-        number_counts = Counter(hand_numbers)
-        for count in number_counts.values():
-            if count >= 3:
-                return True
-
-        sorted_hand = sorted([card for card in self.hand if card != self.dummy_card], key=lambda x: (x[0], x[1]))
-        for i in range(len(sorted_hand) - 2):
-            if (
-                sorted_hand[i][0] == sorted_hand[i + 1][0] == sorted_hand[i + 2][0] and
-                sorted_hand[i][1] + 1 == sorted_hand[i + 1][1] and
-                sorted_hand[i + 1][1] + 1 == sorted_hand[i + 2][1]
-            ):
-                return True
-
-        return False
+        # Same-number or same-color sequential combinations only
+        return bool(COMBINATION_BITS_LIST[HAND_ROWS[self.hand_mask]] & SAME_NUMBER_OR_COLOR_BITS)
 
     def render(self):
         pass
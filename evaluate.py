@@ -0,0 +1,172 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+from hand_tables import NUM_CARDS
+from numpy_policy import NumpyDQNetwork, load_weights
+from symmetry import CanonicalColorPolicy
+from traces import TraceWriter
+from vector_environment import VectorOkeyEnvironment
+
+# Greedy evaluation of trained models on a fixed suite of deals. The suite only depends on its
+# seed, so every model is scored on exactly the same games and two models can be compared deal by deal.
+
+ACTION_TYPE_NAMES = ('same_number', 'same_color_run', 'different_color_run', 'discard')
+ACTION_TYPES = np.repeat(np.arange(len(ACTION_TYPE_NAMES)), [8, 6, 6, 24])  # Action -> index in ACTION_TYPE_NAMES
+
+
+def generate_deals(num_deals, seed=0):
+    # (num_deals, 24) card indices in deck order, see OkeyEnvironment.reset
+    rng = np.random.default_rng(seed)
+    return rng.permuted(np.tile(np.arange(NUM_CARDS, dtype=np.int8), (num_deals, 1)), axis=1)
+
+
+def random_actions(valid_masks, rng):
+    # Uniform choice among the legal actions of every row
+    return (rng.random(valid_masks.shape) * valid_masks).argmax(axis=1)
+
+
+def play_deals(policy, deals, seed=0):
+    # Plays every deal once, policy None picks uniformly random legal actions. Returns the score of
+    # every deal, how often and for how many points it used each action type, and the moves and their
+    # rewards (num_deals, 24) with the number of moves of every game for the trace writer.
+    env = VectorOkeyEnvironment(len(deals), seed=seed)
+    rng = np.random.default_rng(seed)
+    states = env.reset(deals)
+    active = np.ones(len(deals), dtype=bool)
+    scores = np.zeros(len(deals), dtype=np.int64)
+    type_counts = np.zeros((len(deals), len(ACTION_TYPE_NAMES)), dtype=np.int64)
+    type_points = np.zeros((len(deals), len(ACTION_TYPE_NAMES)), dtype=np.int64)
+    moves = np.zeros((len(deals), NUM_CARDS), dtype=np.uint8)
+    move_rewards = np.zeros((len(deals), NUM_CARDS), dtype=np.int64)
+    lengths = np.zeros(len(deals), dtype=np.int64)
+    while active.any():
+        valid_masks = env.valid_action_mask()
+        actions = policy.act_batch(states, valid_masks) if policy is not None else random_actions(valid_masks, rng)
+        states, rewards, dones = env.step(actions)
+        # Finished games are reset by the environment, their later moves are not counted
+        rows = np.nonzero(active)[0]
+        types = ACTION_TYPES[actions[rows]]
+        scores[rows] += rewards[rows]
+        np.add.at(type_counts, (rows, types), 1)
+        np.add.at(type_points, (rows, types), rewards[rows])
+        moves[rows, lengths[rows]] = actions[rows]
+        move_rewards[rows, lengths[rows]] = rewards[rows]
+        lengths[rows] += 1
+        active &= ~dones
+    return scores, type_counts, type_points, moves, move_rewards, lengths
+
+
+_worker_policy = None
+
+
+def _init_worker(weights, canonical_colors=False):
+    global _worker_policy
+    _worker_policy = NumpyDQNetwork(weights) if weights is not None else None
+    if _worker_policy is not None and canonical_colors:
+        _worker_policy = CanonicalColorPolicy(_worker_policy)
+
+
+def _play_chunk(chunk):
+    deals, seed = chunk
+    return play_deals(_worker_policy, deals, seed)
+
+
+def evaluate(model_path, deals, num_workers=1, chunk_size=4096, canonical_colors=False):
+    # model_path 'random' scores the uniformly random policy. Chunks are seeded by their position, so
+    # the results do not depend on the number of workers. canonical_colors for models trained with
+    # Config.canonical_colors.
+    weights = None if model_path == 'random' else load_weights(model_path)
+    chunks = [(deals[start:start + chunk_size], start) for start in range(0, len(deals), chunk_size)]
+    if num_workers > 1:
+        with mp.get_context('spawn').Pool(num_workers, initializer=_init_worker,
+                                          initargs=(weights, canonical_colors)) as pool:
+            results = pool.map(_play_chunk, chunks)
+    else:
+        _init_worker(weights, canonical_colors)
+        results = [_play_chunk(chunk) for chunk in chunks]
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+
+def confidence_interval(values):
+    # Half-width of the normal 95% interval of the mean
+    return float(1.96 * values.std(ddof=1) / np.sqrt(len(values))) if len(values) > 1 else float('nan')
+
+
+def summarize(scores, type_counts, type_points):
+    summary = {
+        'deals': len(scores),
+        'mean_score': float(scores.mean()),
+        'ci95': confidence_interval(scores),
+        'action_types': {},
+    }
+    for i, name in enumerate(ACTION_TYPE_NAMES):
+        summary['action_types'][name] = {
+            'per_game': float(type_counts[:, i].mean()),
+            'points_per_game': float(type_points[:, i].mean()),
+            'games_using': float((type_counts[:, i] > 0).mean()),
+        }
+    return summary
+
+
+def compare(scores, reference_scores):
+    # Paired over the same deals, much tighter than comparing the two means
+    difference = scores - reference_scores
+    return {
+        'mean_difference': float(difference.mean()),
+        'difference_ci95': confidence_interval(difference),
+        'better': float((difference > 0).mean()),
+        'worse': float((difference < 0).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Greedy evaluation on a fixed suite of deals")
+    parser.add_argument('models', nargs='+', help="Model or checkpoint files (.pth, .pt, .npz) or 'random', "
+                                                  "every model after the first is compared to the first")
+    parser.add_argument('--deals', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the deal suite")
+    parser.add_argument('--deals-file', help="Use the deals saved in this .npy file instead of generating them")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--canonical-colors', action='store_true',
+                        help="The models were trained with Config.canonical_colors")
+    parser.add_argument('--trace-dir', help="Record the games of every model to <trace-dir>/<model>.okt")
+    args = parser.parse_args()
+
+    deals = np.load(args.deals_file) if args.deals_file else generate_deals(args.deals, args.seed)
+    results = {}
+    reference = None
+    for model_path in args.models:
+        start = time.perf_counter()
+        scores, type_counts, type_points, moves, move_rewards, lengths = evaluate(model_path, deals, args.workers,
+                                                                                 canonical_colors=args.canonical_colors)
+        summary = summarize(scores, type_counts, type_points)
+        print(f"{model_path}: {summary['mean_score']:.2f} ± {summary['ci95']:.2f} (95% CI) over {len(deals)} deals "
+              f"in {time.perf_counter() - start:.1f}s")
+        for name, usage in summary['action_types'].items():
+            print(f"  {name}: {usage['per_game']:.2f} per game, {usage['points_per_game']:.2f} points per game, "
+                  f"used in {usage['games_using']:.1%} of games")
+        if reference is None:
+            reference = (model_path, scores)
+        else:
+            summary['compared_to'] = reference[0]
+            summary.update(compare(scores, reference[1]))
+            print(f"  vs {reference[0]}: {summary['mean_difference']:+.2f} ± {summary['difference_ci95']:.2f}, "
+                  f"better on {summary['better']:.1%} of deals, worse on {summary['worse']:.1%}")
+        results[model_path] = summary
+        if args.trace_dir:
+            os.makedirs(args.trace_dir, exist_ok=True)
+            played = np.arange(NUM_CARDS) < lengths[:, None]
+            trace_path = os.path.join(args.trace_dir, os.path.splitext(os.path.basename(model_path))[0] + '.okt')
+            TraceWriter(trace_path).add_episodes(deals, lengths, moves[played], move_rewards[played])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'deals': len(deals), 'seed': args.seed, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Lookup tables over every hand of at most 5 cards, the hand is a 24-bit mask
+# with bit (color * 8 + number - 1) set for each card held.
+NUM_CARDS = 24
+HAND_SIZE = 5
+NUM_ACTIONS = 44
+NUM_COMBINATIONS = 20  # Actions 0-19, the rest are discards
+
+# Numbers used by each combination action 0-19
+COMBINATION_NUMBERS = (
+    [(n, n, n) for n in range(1, 9)] +
+    [(n, n + 1, n + 2) for n in range(1, 7)] +
+    [(n, n + 1, n + 2) for n in range(1, 7)]
+)
+
+# Actions 0-13 (same-number and same-color sequential) keep a game going after the deck runs out
+SAME_NUMBER_OR_COLOR_BITS = (1 << 14) - 1
+
+
+def card_index(card):
+    color, number = card
+    return color * 8 + (number - 1)
+
+
+def card_from_index(index):
+    return (index // 8, index % 8 + 1)
+
+
+def cards_to_mask(cards):
+    mask = 0
+    for card in cards:
+        if card != (-1, -1):
+            mask |= 1 << card_index(card)
+    return mask
+
+
+def mask_to_indices(mask):
+    return [i for i in range(NUM_CARDS) if mask >> i & 1]
+
+
+def mask_to_cards(mask):
+    return [card_from_index(i) for i in mask_to_indices(mask)]
+
+
+def combination_action(n1, n2, n3):
+    # Maps the numbers of a combination to its action pair (same color, different color)
+    low, mid, high = sorted((n1, n2, n3))
+    if low == high and 1 <= low <= 8:
+        return low - 1, low - 1
+    if mid == low + 1 and high == mid + 1 and 1 <= low <= 6:
+        return 8 + low - 1, 14 + low - 1
+    return None
+
+
+def _build_tables():
+    # Grow hands one card at a time, only adding cards above the highest one held
+    level_masks, level_highest = np.zeros(1, dtype=np.int64), np.full(1, -1)
+    hand_masks = [level_masks]
+    for _ in range(HAND_SIZE):
+        grown = [(level_masks[level_highest < c] | (1 << c), c) for c in range(NUM_CARDS)]
+        level_masks = np.concatenate([masks for masks, _ in grown])
+        level_highest = np.concatenate([np.full(len(masks), c) for masks, c in grown])
+        hand_masks.append(level_masks)
+    hand_masks = np.sort(np.concatenate(hand_masks))
+
+    held = ((hand_masks[:, None] >> np.arange(NUM_CARDS)) & 1).astype(bool).reshape(-1, 3, 8)
+    color_bits = 1 << (8 * np.arange(3))
+    valid = np.zeros((len(hand_masks), NUM_ACTIONS), dtype=bool)
+    removed = np.zeros((len(hand_masks), NUM_COMBINATIONS), dtype=np.int64)
+
+    # Same-number combinations take the card of every color
+    for n in range(8):
+        valid[:, n] = held[:, :, n].all(axis=1)
+        removed[valid[:, n], n] = (color_bits << n).sum()
+
+    for i in range(6):
+        # Same-color sequential combinations use the lowest color holding the run
+        runs = held[:, :, i] & held[:, :, i + 1] & held[:, :, i + 2]
+        same_color = runs.any(axis=1)
+        valid[:, 8 + i] = same_color
+        removed[same_color, 8 + i] = (7 << i) << (8 * runs[same_color].argmax(axis=1))
+
+        # Otherwise a different-color run takes the lowest color of each number
+        present = held[:, :, i:i + 3].any(axis=1).all(axis=1)
+        different_color = present & ~same_color
+        valid[:, 14 + i] = different_color
+        for n in range(i, i + 3):
+            lowest_color = held[different_color, :, n].argmax(axis=1)
+            removed[different_color, 14 + i] |= 1 << (8 * lowest_color + n)
+
+    valid[:, NUM_COMBINATIONS:] = held.reshape(-1, NUM_CARDS)
+    combination_bits = (valid[:, :NUM_COMBINATIONS] << np.arange(NUM_COMBINATIONS)).sum(axis=1)
+    return hand_masks, valid, combination_bits, removed
+
+
+# Built once at import, a few tens of milliseconds
+HAND_MASKS, VALID_ACTION_MASKS, COMBINATION_BITS, REMOVED_CARDS = _build_tables()
+HAND_ROWS = {int(mask): row for row, mask in enumerate(HAND_MASKS)}
+COMBINATION_BITS_LIST = COMBINATION_BITS.tolist()
+
+
+def hand_rows(masks):
+    # Vectorized HAND_ROWS lookup for arrays of hand masks
+    return np.searchsorted(HAND_MASKS, masks)
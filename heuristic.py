@@ -0,0 +1,104 @@
+import itertools
+from hand_tables import HAND_ROWS, COMBINATION_BITS_LIST, combination_action, mask_to_indices
+
+# Python port of the rule-based player in okey_algorithm_cpp/okey_game_algorithm.cpp. getBestMove
+# scores every move with a depth-3 minimax in which the player's own moves alternate between
+# maximising and minimising, cards are never drawn during the search and a node without moves is
+# worth +-9999. Alpha-beta pruning does not change minimax values, so the values are computed
+# exactly and memoised on (hand, depth, maximising, deck empty) instead.
+
+NO_MOVES = 9999
+SEARCH_DEPTH = 3
+
+
+def card_number(index):
+    return index % 8 + 1
+
+
+def card_color(index):
+    return index // 8
+
+
+def evaluate_combination(cards):
+    # evaluateCombination: points of three cards, 0 when they are not a combination
+    numbers = sorted(card_number(index) for index in cards)
+    if numbers[0] == numbers[2]:
+        return 10 * numbers[0] + 10
+    sequential = numbers[1] == numbers[0] + 1 and numbers[2] == numbers[1] + 1
+    if sequential and len({card_color(index) for index in cards}) == 1:
+        return 40 + 10 * numbers[0]
+    if sequential:
+        return 10 * numbers[0]
+    return 0
+
+
+def generate_moves(hand_cards):
+    # generateMoves: every discard, then every scoring 3-card combination, in hand order
+    moves = [(card,) for card in hand_cards]
+    for cards in itertools.combinations(hand_cards, 3):
+        if evaluate_combination(cards) > 0:
+            moves.append(cards)
+    return moves
+
+
+def any_combination_possible(hand_cards):
+    return any(evaluate_combination(cards) > 0 for cards in itertools.combinations(hand_cards, 3))
+
+
+class HeuristicPolicy:
+    def __init__(self):
+        self.memo = {}
+
+    def search(self, hand, depth, maximizing, deck_empty):
+        # minimax without the score so far, which only shifts every value of a node by the same amount.
+        # The +-NO_MOVES of a node without moves is an absolute score and is passed up unchanged.
+        if depth == 0:
+            return 0
+        key = (hand, depth, maximizing, deck_empty)
+        value = self.memo.get(key)
+        if value is not None:
+            return value
+        moves = generate_moves(mask_to_indices(hand))
+        if not moves:
+            value = -NO_MOVES if maximizing else NO_MOVES
+        else:
+            values = [self.move_value(hand, move, depth - 1, not maximizing, deck_empty) for move in moves]
+            value = max(values) if maximizing else min(values)
+        self.memo[key] = value
+        return value
+
+    def move_value(self, hand, move, depth, maximizing, deck_empty):
+        # makeMove followed by minimax on the new state
+        points = evaluate_combination(move) if len(move) == 3 else 0
+        for card in move:
+            hand &= ~(1 << card)
+        if deck_empty and not any_combination_possible(mask_to_indices(hand)):
+            return points  # gameOver
+        value = self.search(hand, depth, maximizing, deck_empty)
+        return value if abs(value) == NO_MOVES else points + value
+
+    def best_move(self, hand_cards, deck_empty):
+        # getBestMove: the first move with the highest value, hand_cards in the order they were drawn
+        hand = 0
+        for card in hand_cards:
+            hand |= 1 << card
+        best_value, best = -NO_MOVES, None
+        for move in generate_moves(hand_cards):
+            value = self.move_value(hand, move, SEARCH_DEPTH, False, deck_empty)
+            if value > best_value:
+                best_value, best = value, move
+        return best
+
+    def act(self, env):
+        # Environment action of the best move. A combination is played as the action of its kind and
+        # numbers and the environment picks the cards, a mixed-colour run becomes the same-colour run
+        # of its numbers when the hand holds one, the environment has no action for the mixed one then.
+        hand_cards = [card for card in env.drawn_cards if env.hand_mask >> card & 1]
+        move = self.best_move(hand_cards, len(env.deck_cards) == 0)
+        if len(move) == 1:
+            return 20 + move[0]
+        same_color_action, different_color_action = combination_action(*(card_number(index) for index in move))
+        if len({card_color(index) for index in move}) > 1 and \
+                COMBINATION_BITS_LIST[HAND_ROWS[env.hand_mask]] >> different_color_action & 1:
+            return different_color_action
+        return same_color_action
@@ -1,14 +1,27 @@
+import argparse
 from environment import OkeyEnvironment
 from agent import DQNAgent
 from train import train_agent
 from config import Config
+from checkpoint import latest_checkpoint
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the DQN agent")
+    parser.add_argument('--resume', nargs='?', const='latest',
+                        help="Continue from a checkpoint file, the newest one in Config.checkpoint_dir by default")
+    args = parser.parse_args()
+
     config = Config()
     env = OkeyEnvironment()
     agent = DQNAgent(env.state_size, env.action_size, config)
+
+    resume_from = args.resume
+    if resume_from == 'latest':
+        resume_from = latest_checkpoint(config.checkpoint_dir)
+        if resume_from is None:
+            parser.error(f"No checkpoint found in {config.checkpoint_dir}")
     
-    train_agent(env, agent, config)
+    train_agent(env, agent, config, resume_from)
 
 if __name__ == "__main__":
     main()
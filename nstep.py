@@ -0,0 +1,104 @@
+import numpy as np
+from replay_buffer import STATE_SIZE, ACTION_SIZE, pack_transitions
+
+# n-step returns between the environment and the replay buffer. A transition from step t stores
+#   r_t + gamma r_t+1 + ... + gamma^(k-1) r_t+k-1, the position after step t+k-1 and k (the record's
+#   'steps'), so DQNAgent.replay bootstraps with gamma^k. k is n_step, or less when the game ends first,
+#   the last transitions of a game then end with done and are not bootstrapped at all.
+
+
+def return_weights(n_step, gamma):
+    # weights[offset, m] = gamma^(m - offset) for m >= offset, discounts the rewards after offset
+    exponents = np.arange(n_step)[None, :] - np.arange(n_step)[:, None]
+    return np.where(exponents >= 0, gamma ** np.maximum(exponents, 0), 0.0)
+
+
+class NStepAccumulator:
+    # Streaming n-step transitions for num_games games played in lockstep (a scalar environment is
+    # num_games=1). Each game keeps a ring window of its last n_step steps, add() returns the packed
+    # records that the new steps complete: the oldest step of every full window, and every pending step
+    # of the games that just ended.
+    def __init__(self, n_step, gamma, num_games=1):
+        self.n_step = n_step
+        self.num_games = num_games
+        self.weights = return_weights(n_step, gamma)
+        self.states = np.zeros((num_games, n_step, STATE_SIZE), dtype=np.float32)
+        self.actions = np.zeros((num_games, n_step), dtype=np.int64)
+        self.rewards = np.zeros((num_games, n_step))
+        self.start = np.zeros(num_games, dtype=np.int64)  # Ring slot of the oldest pending step
+        self.count = np.zeros(num_games, dtype=np.int64)
+        # Position after the newest step of every game, the bootstrap position of its pending steps
+        self.next_states = np.zeros((num_games, STATE_SIZE), dtype=np.float32)
+        self.next_masks = np.zeros((num_games, ACTION_SIZE), dtype=bool)
+        self.dones = np.zeros(num_games, dtype=bool)
+
+    def add(self, states, actions, rewards, next_states, dones, next_masks, games=None):
+        # One step of each game in games (all games by default), arrays with one row per game
+        games = np.arange(self.num_games) if games is None else np.asarray(games)
+        dones = np.asarray(dones, dtype=bool).reshape(len(games))
+        slots = (self.start[games] + self.count[games]) % self.n_step
+        self.states[games, slots] = states
+        self.actions[games, slots] = actions
+        self.rewards[games, slots] = rewards
+        self.next_states[games] = next_states
+        self.next_masks[games] = next_masks
+        self.dones[games] = dones
+        self.count[games] += 1
+
+        full = games[~dones & (self.count[games] == self.n_step)]
+        ended = games[dones]
+        ended_offsets = [np.arange(count) for count in self.count[ended]]
+        records = self._emit(np.concatenate([full, np.repeat(ended, self.count[ended])]),
+                             np.concatenate([np.zeros(len(full), dtype=np.int64)] + ended_offsets))
+        self.start[full] = (self.start[full] + 1) % self.n_step
+        self.count[full] -= 1
+        self.start[ended] = 0
+        self.count[ended] = 0
+        return records
+
+    def flush(self):
+        # Records of every pending step, bootstrapped from the newest position of their game. For games
+        # cut short without done, e.g. by max_steps_per_episode.
+        games = np.repeat(np.arange(self.num_games), self.count)
+        offsets = np.concatenate([np.arange(count) for count in self.count]) if len(games) else games
+        records = self._emit(games, offsets)
+        self.start[:] = 0
+        self.count[:] = 0
+        return records
+
+    def _emit(self, games, offsets):
+        # Transitions starting offset steps after the oldest pending step of their game
+        window = (self.start[games, None] + np.arange(self.n_step)) % self.n_step
+        pending = np.arange(self.n_step) < self.count[games, None]
+        rewards = np.where(pending, self.rewards[games[:, None], window], 0.0)
+        returns = (rewards * self.weights[offsets]).sum(axis=1)
+        slots = (self.start[games] + offsets) % self.n_step
+        return pack_transitions(self.states[games, slots], self.actions[games, slots], returns,
+                                self.next_states[games], self.dones[games], self.next_masks[games],
+                                self.count[games] - offsets)
+
+
+def nstep_records(records, n_step, gamma):
+    # The same transitions from packed single-step records in game order, as written by rollout workers
+    # and traces.chunk_transitions. A game without done at the end of records is bootstrapped from its
+    # last position.
+    if n_step == 1 or len(records) == 0:
+        return records
+    done_indices = np.flatnonzero(records['done'])
+    positions = np.arange(len(records))
+    episode_end = np.append(done_indices, len(records) - 1)[np.searchsorted(done_indices, positions)]
+    steps = np.minimum(n_step, episode_end - positions + 1)
+    last = positions + steps - 1
+
+    padded_rewards = np.concatenate([records['reward'].astype(np.float64), np.zeros(n_step)])
+    window = padded_rewards[positions[:, None] + np.arange(n_step)]
+    window = np.where(np.arange(n_step) < steps[:, None], window, 0.0)
+    returns = (window * return_weights(n_step, gamma)[0]).sum(axis=1)
+
+    result = records.copy()
+    result['reward'] = returns
+    result['next_state'] = records['next_state'][last]
+    result['next_mask'] = records['next_mask'][last]
+    result['done'] = records['done'][last]
+    result['steps'] = steps
+    return result
@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+
+# Greedy DQNetwork inference on NumPy arrays, so playing does not need torch.
+# The weights come from export_model, one .npz holding the fc1/fc2/fc3 tensors.
+
+LAYERS = ('fc1', 'fc2', 'fc3')
+
+
+class NumpyDQNetwork:
+    def __init__(self, weights):
+        # weights: path of an exported .npz or a {name: array} dict as returned by load_weights
+        if isinstance(weights, str):
+            with np.load(weights) as archive:
+                weights = dict(archive)
+        # Stored as torch's (out, in), kept as (in, out) so a forward pass is x @ W + b
+        self.weights = [np.ascontiguousarray(weights[f'{layer}.weight'].T, dtype=np.float32) for layer in LAYERS]
+        self.biases = [np.asarray(weights[f'{layer}.bias'], dtype=np.float32) for layer in LAYERS]
+        self.state_size = self.weights[0].shape[0]
+        self.action_size = self.weights[-1].shape[1]
+
+    def q_values(self, states):
+        x = np.asarray(states, dtype=np.float32)
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = np.maximum(x @ weight + bias, 0)
+        return x @ self.weights[-1] + self.biases[-1]
+
+    def act_batch(self, states, valid_masks):
+        # Best legal action of every state, valid_masks (N, action_size)
+        q_values = np.where(valid_masks, self.q_values(states), -np.inf)
+        return q_values.argmax(axis=1)
+
+    def act(self, state, valid_actions):
+        # Same interface as DQNAgent.act with epsilon 0, a list of actions or a boolean mask
+        valid_actions = np.asarray(valid_actions)
+        if valid_actions.dtype == bool:
+            valid_actions = np.flatnonzero(valid_actions)
+        q_values = self.q_values(state)
+        return int(valid_actions[q_values[valid_actions].argmax()])
+
+
+def load_weights(model_path):
+    # NumPy weights of a saved state_dict or of a training checkpoint, the only place torch is needed
+    if model_path.endswith('.npz'):
+        with np.load(model_path) as archive:
+            return dict(archive)
+    import torch
+    state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
+    if 'model' in state_dict:
+        state_dict = state_dict['model']
+    return {name: tensor.numpy() for name, tensor in state_dict.items()}
+
+
+def export_model(model_path, output_path):
+    np.savez(output_path, **load_weights(model_path))
+
+
+def load_policy(model_path, canonical_colors=False):
+    # Loads the .npz next to a .pth model, exporting it first when it is missing or older than the model,
+    # e.g. after retraining. canonical_colors for models trained with Config.canonical_colors.
+    if model_path.endswith('.npz'):
+        policy = NumpyDQNetwork(model_path)
+    else:
+        export_path = os.path.splitext(model_path)[0] + '.npz'
+        if not os.path.exists(export_path) or os.path.getmtime(export_path) < os.path.getmtime(model_path):
+            export_model(model_path, export_path)
+        policy = NumpyDQNetwork(export_path)
+    if canonical_colors:
+        from symmetry import CanonicalColorPolicy
+        policy = CanonicalColorPolicy(policy)
+    return policy
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python numpy_policy.py <model.pth> <model.npz>")
+        sys.exit(1)
+    export_model(sys.argv[1], sys.argv[2])
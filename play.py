@@ -1,9 +1,9 @@
-import torch
-import numpy as np
+import argparse
 from environment import OkeyEnvironment
-from agent import DQNAgent
+from numpy_policy import load_policy
+from search import SearchAgent
+from traces import TraceWriter
 from utils import preprocess_state
-from config import Config
 
 # Map color initials to numeric values used in the environment
 color_to_number = {
@@ -31,21 +31,21 @@ def parse_new_card_input(new_card_input):
     color, number = new_card_input.split(',')
     return (color_to_number[color], int(number))
 
-def play_game_interactively(model_path):
-    # Initialize environment and agent
+def play_game_interactively(model_path, trace_path=None, canonical_colors=False, search_time=None, search_leaf=False):
+    # Initialize environment and the greedy NumPy policy of the trained model, or the search agent when
+    # search_time seconds per move are given
     env = OkeyEnvironment()
-    config = Config()
-    agent = DQNAgent(env.state_size, env.action_size, config)
-    
-    # Load the trained model
-    agent.model.load_state_dict(torch.load(model_path))
+    agent = load_policy(model_path, canonical_colors)
+    if search_time is not None:
+        agent = SearchAgent(search_time, leaf_policy=agent if search_leaf else None)
 
     # Get the starting hand from the user
     print("Provide your starting hand (in the format color1,number1 color2,number2 ...):")
     hand_input = input().strip()
-    env.hand = parse_hand_input(hand_input)
+    env.set_hand(parse_hand_input(hand_input))
 
     total_points = 0
+    actions, rewards = [], []
 
     while True:
         state = preprocess_state(env.get_state())
@@ -58,7 +58,7 @@ def play_game_interactively(model_path):
         if action in range(0, 8):
             # Same-number combination
             combination = env.valid_combinations[action][0]
-            print(f"Making a same-number combination with: {format_hand([combination])}")
+            print(f"Making a same-number combination with: {format_hand(env.combination_cards(action))}")
             env.remove_combination_cards_from_hand(*combination)
             points = env.calculate_reward_for_action(action, same_color=True)
             num_cards_to_draw = min(3, len(env.deck))
@@ -67,16 +67,12 @@ def play_game_interactively(model_path):
                     print(f"Please provide the new card {i+1} (in format color,number):")
                     new_card_input = input().strip()
                     new_card = parse_new_card_input(new_card_input)
-                    for j in range(5):
-                        if env.hand[j] == env.dummy_card:
-                            env.hand[j] = new_card
-                            break
+                    env.draw_card(new_card)
 
         elif action in range(8, 14):
             # Same-color sequential combination
             combination = env.valid_combinations[action][0]
-            print("combination: ", combination)
-            print(f"Making a same-color sequential combination with: {format_hand(combination)}")
+            print(f"Making a same-color sequential combination with: {format_hand(env.combination_cards(action))}")
             env.remove_combination_cards_from_hand(*combination)
             points = env.calculate_reward_for_action(action, same_color=True)
             num_cards_to_draw = min(3, len(env.deck))
@@ -85,18 +81,12 @@ def play_game_interactively(model_path):
                     print(f"Please provide the new card {i+1} (in format color,number):")
                     new_card_input = input().strip()
                     new_card = parse_new_card_input(new_card_input)
-                    for j in range(5):
-                        if env.hand[j] == env.dummy_card:
-                            env.hand[j] = new_card
-                            break
+                    env.draw_card(new_card)
 
         elif action in range(14, 20):
             # Different-color sequential combination
             combination = env.valid_combinations[action][0]
-            # Ensure combination is a list of tuples for formatting
-            if isinstance(combination, tuple):
-                combination = [combination]
-            print(f"Making a different-color sequential combination with: {format_hand(combination)}")
+            print(f"Making a different-color sequential combination with: {format_hand(env.combination_cards(action))}")
             env.remove_combination_cards_from_hand(*combination)
             points = env.calculate_reward_for_action(action, same_color=False)
             num_cards_to_draw = min(3, len(env.deck))
@@ -105,26 +95,23 @@ def play_game_interactively(model_path):
                     print(f"Please provide the new card {i+1} (in format color,number):")
                     new_card_input = input().strip()
                     new_card = parse_new_card_input(new_card_input)
-                    for j in range(5):
-                        if env.hand[j] == env.dummy_card:
-                            env.hand[j] = new_card
-                            break
+                    env.draw_card(new_card)
 
         elif action in range(20, 44):
             # Discard action based on specific card
             card_to_discard = env.get_card_from_action_index(action)
             print(f"Discarding card: {format_hand([card_to_discard])[0]}")
-            index = env.hand.index(card_to_discard)
-            env.hand[index] = env.dummy_card
-            env.discarded.append(card_to_discard)
+            env.discard_card(card_to_discard)
             points = 0  # No points for discarding
             if len(env.deck) > 0:
                 print("Please provide the new card from the deck (in format color,number):")
                 new_card_input = input().strip()
                 new_card = parse_new_card_input(new_card_input)
-                env.hand[index] = new_card
+                env.draw_card(new_card)
 
         total_points += points
+        actions.append(action)
+        rewards.append(points)
 
         # Display the current hand after the action
         print(f"Your current hand: {format_hand(env.hand)}")
@@ -137,7 +124,22 @@ def play_game_interactively(model_path):
             print("Game over!")
             break
 
+    if trace_path is not None:
+        # The deck order is only known once the game is over, played_deal rebuilds it from the drawn cards
+        writer = TraceWriter(trace_path)
+        writer.add_episode(env.played_deal(), actions, rewards)
+        writer.close()
+
 
 if __name__ == "__main__":
-    model_path = "dqn_model_v1.pth"  # Path to your trained model
-    play_game_interactively(model_path)
+    parser = argparse.ArgumentParser(description="Play a game with suggestions from the trained model")
+    parser.add_argument('--model', default="dqn_model_v1.pth", help="Path to your trained model")
+    parser.add_argument('--trace', help="Append the finished game to this trace file")
+    parser.add_argument('--canonical-colors', action='store_true',
+                        help="The model was trained with Config.canonical_colors")
+    parser.add_argument('--search', type=float, metavar='SECONDS',
+                        help="Suggest moves with the expectimax search agent, answering within SECONDS")
+    parser.add_argument('--search-leaf', action='store_true',
+                        help="Score the positions at the search depth limit with the model's Q-values")
+    args = parser.parse_args()
+    play_game_interactively(args.model, args.trace, args.canonical_colors, args.search, args.search_leaf)
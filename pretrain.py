@@ -0,0 +1,78 @@
+import multiprocessing as mp
+import os
+import numpy as np
+from environment import OkeyEnvironment
+from heuristic import HeuristicPolicy
+from nstep import nstep_records
+from replay_buffer import ReplayBuffer
+from traces import TraceWriter, chunk_transitions, read_chunks
+
+# Warm start of the DQN from games of the heuristic player (heuristic.py). The expert games are
+# stored as a trace file, the network is then fitted on their transitions with the TD loss plus a
+# large-margin term that makes the expert's action the greedy one (as in DQfD), and the transitions
+# stay in the replay buffer for the start of training.
+
+
+def play_expert_games(seed, num_episodes):
+    # One worker's share, returned as trace columns (deals, lengths, actions, rewards)
+    env = OkeyEnvironment(seed=seed)
+    policy = HeuristicPolicy()
+    deals, lengths, actions, rewards = [], [], [], []
+    for _ in range(num_episodes):
+        env.reset()
+        length = 0
+        done = False
+        while not done:
+            action = policy.act(env)
+            _, reward, done = env.step(action)
+            actions.append(action)
+            rewards.append(reward)
+            length += 1
+        deals.append(env.played_deal())
+        lengths.append(length)
+    return np.array(deals, dtype=np.uint8), np.array(lengths, dtype=np.uint8), \
+        np.array(actions, dtype=np.uint8), np.array(rewards, dtype=np.int64)
+
+
+def _play_expert_job(job):
+    return play_expert_games(*job)
+
+
+def generate_expert_games(path, num_episodes, num_workers=1, seed=0, job_size=1000):
+    # Writes num_episodes heuristic games to a trace file, jobs of job_size games are spread over the workers
+    jobs = [(seed + start, min(job_size, num_episodes - start)) for start in range(0, num_episodes, job_size)]
+    writer = TraceWriter(path)
+    if num_workers > 1:
+        with mp.get_context('spawn').Pool(num_workers) as pool:
+            for columns in pool.imap(_play_expert_job, jobs):
+                writer.add_episodes(*columns)
+    else:
+        for job in jobs:
+            writer.add_episodes(*_play_expert_job(job))
+    writer.close()
+
+
+def load_expert_transitions(config):
+    # Packed config.n_step transitions of config.expert_episodes heuristic games, generated once and
+    # reused from the trace file
+    path = config.expert_trace_path
+    if not os.path.exists(path):
+        print(f"Generating {config.expert_episodes} expert games in {path}")
+        generate_expert_games(path, config.expert_episodes, config.expert_workers)
+    records = np.concatenate([chunk_transitions(*chunk) for chunk in read_chunks(path)])
+    return nstep_records(records, config.n_step, config.gamma)
+
+
+def pretrain_agent(agent, replay_buffer, optimizer, config):
+    records = load_expert_transitions(config)
+    expert_buffer = ReplayBuffer(len(records))
+    expert_buffer.add_records(records)
+    print(f"Pretraining on {len(records)} expert transitions for {config.pretrain_updates} updates")
+    for update in range(config.pretrain_updates):
+        agent.replay_expert(expert_buffer.sample(config.batch_size), optimizer, config.pretrain_margin)
+        if (update + 1) % config.pretrain_target_update == 0:
+            agent.update_target_network()
+    agent.update_target_network()
+    # The warm-started policy needs far less exploration than a random network
+    agent.epsilon = config.pretrain_epsilon
+    replay_buffer.add_records(records[-config.buffer_size:])
@@ -1,15 +1,317 @@
-import random
-from collections import deque
+import json
+import mmap
+import os
+import numpy as np
+
+STATE_SIZE = 72
+ACTION_SIZE = 44
+
+# One fixed-width record per transition, 31 bytes. States and valid-action masks are
+# binary so they are stored bit-packed. An n-step transition (see nstep.py) holds the discounted
+# reward of its steps and bootstraps from next_state with gamma ** steps.
+TRANSITION_DTYPE = np.dtype([
+    ('state', np.uint8, (STATE_SIZE + 7) // 8),
+    ('next_state', np.uint8, (STATE_SIZE + 7) // 8),
+    ('next_mask', np.uint8, (ACTION_SIZE + 7) // 8),
+    ('action', np.int8),
+    ('reward', np.float32),
+    ('done', np.bool_),
+    ('steps', np.uint8),
+])
+
+
+def pack_bits(values):
+    return np.packbits(np.asarray(values) != 0, axis=-1)
+
+
+def unpack_bits(packed, count):
+    return np.unpackbits(packed, axis=-1, count=count)
+
+
+def pack_transitions(states, actions, rewards, next_states, dones, next_masks, steps=1):
+    records = np.zeros(len(actions), dtype=TRANSITION_DTYPE)
+    records['state'] = pack_bits(states)
+    records['next_state'] = pack_bits(next_states)
+    records['next_mask'] = pack_bits(next_masks)
+    records['action'] = actions
+    records['reward'] = rewards
+    records['done'] = dones
+    records['steps'] = steps
+    return records
+
+
+def upgrade_records(records):
+    # Records of an older TRANSITION_DTYPE (integer single-step rewards, no steps field), e.g. from an
+    # older checkpoint, copied field by field
+    if records.dtype == TRANSITION_DTYPE:
+        return records
+    upgraded = np.zeros(len(records), dtype=TRANSITION_DTYPE)
+    upgraded['steps'] = 1
+    for name in records.dtype.names:
+        upgraded[name] = records[name]
+    return upgraded
+
+
+def sampling_rng(seed=None):
+    # Generator of minibatch indices. Unseeded buffers draw their seed from the global NumPy RNG, like
+    # OkeyEnvironment falls back on the random module, so np.random.seed also fixes which transitions
+    # are replayed
+    return np.random.default_rng(np.random.randint(2**31) if seed is None else seed)
+
 
 class ReplayBuffer:
-    def __init__(self, buffer_size):
-        self.buffer = deque(maxlen=buffer_size)
+    # Ring buffer over a preallocated record array, the oldest transitions are overwritten first
+    def __init__(self, buffer_size, seed=None):
+        self.buffer_size = buffer_size
+        self.storage = np.zeros(buffer_size, dtype=TRANSITION_DTYPE)
+        self.position = 0
+        self.size = 0
+        self.rng = sampling_rng(seed)
 
     def add(self, experience):
-        self.buffer.append(experience)
+        # experience: (state, action, reward, next_state, done, next_valid_mask)
+        state, action, reward, next_state, done, next_mask = experience
+        record = self.storage[self.position]
+        record['state'] = pack_bits(state)
+        record['next_state'] = pack_bits(next_state)
+        record['next_mask'] = pack_bits(next_mask)
+        record['action'] = action
+        record['reward'] = reward
+        record['done'] = done
+        record['steps'] = 1
+        self.position = (self.position + 1) % self.buffer_size
+        self.size = min(self.size + 1, self.buffer_size)
+
+    def add_batch(self, states, actions, rewards, next_states, dones, next_masks):
+        self.add_records(pack_transitions(states, actions, rewards, next_states, dones, next_masks))
+
+    def add_records(self, records):
+        # Transitions already packed with pack_transitions, e.g. sent by rollout workers
+        indices = (self.position + np.arange(len(records))) % self.buffer_size
+        self.storage[indices] = records
+        self.position = (self.position + len(records)) % self.buffer_size
+        self.size = min(self.size + len(records), self.buffer_size)
 
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
+        indices = self.rng.integers(0, self.size, size=batch_size)
+        return self.gather(indices)
+
+    def gather(self, indices):
+        # Contiguous tensors ready for DQNAgent.replay. torch is only imported here, the record helpers
+        # above are also used by torch-free tools (traces.py, play.py, server.py)
+        import torch
+        records = self.storage[indices]
+        return (
+            torch.from_numpy(unpack_bits(records['state'], STATE_SIZE)).float(),
+            torch.from_numpy(records['action'].astype(np.int64)),
+            torch.from_numpy(records['reward'].astype(np.float32)),
+            torch.from_numpy(unpack_bits(records['next_state'], STATE_SIZE)).float(),
+            torch.from_numpy(records['done']),
+            torch.from_numpy(unpack_bits(records['next_mask'], ACTION_SIZE).astype(bool)),
+            torch.from_numpy(records['steps'].astype(np.float32)),
+        )
+
+    def state_dict(self):
+        # Copy of the filled records, the ring position and the sampling RNG, for checkpoints
+        return {
+            'storage': self.storage[:self.size].copy(),
+            'position': self.position,
+            'size': self.size,
+            'rng': self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state):
+        if len(state['storage']) > self.buffer_size:
+            raise ValueError(f"Checkpoint holds {len(state['storage'])} transitions, buffer_size is {self.buffer_size}")
+        self.storage[:state['size']] = upgrade_records(state['storage'])
+        self.position = state['position']
+        self.size = state['size']
+        self.rng.bit_generator.state = state['rng']
+
+    def flush(self):
+        pass  # Nothing to write for in-memory storage
 
     def __len__(self):
-        return len(self.buffer)
+        return self.size
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    # Ring buffer whose records live in a numpy.memmap file, only the ring position and size are kept
+    # in RAM. They are saved next to the file (path + '.json') on every flush, so a restarted learner
+    # or read-only samplers in other processes reopen the same transitions without copying them.
+    def __init__(self, buffer_size, path, seed=None, readonly=False, flush_interval=4096):
+        self.buffer_size = buffer_size
+        self.path = path
+        self.metadata_path = path + '.json'
+        self.readonly = readonly
+        self.flush_interval = flush_interval
+        # Records written or gathered since the last flush. The kernel maps up to 64 KB around every
+        # randomly read record, so at most about flush_interval * 64 KB stays resident between flushes
+        self.touched = 0
+        self.position = 0
+        self.size = 0
+        self.rng = sampling_rng(seed)
+
+        exists = os.path.exists(path)
+        if exists and os.path.getsize(path) != buffer_size * TRANSITION_DTYPE.itemsize:
+            raise ValueError(f"{path} does not hold {buffer_size} transition records")
+        if readonly and not exists:
+            raise FileNotFoundError(path)
+        # The mmap object is kept for flush and madvise, the records are a NumPy view of it
+        with open(path, 'rb' if readonly else ('r+b' if exists else 'w+b')) as f:
+            if not exists:
+                f.truncate(buffer_size * TRANSITION_DTYPE.itemsize)
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        self.storage = np.frombuffer(self.mmap, dtype=TRANSITION_DTYPE)
+        # Sampling touches random pages, read-ahead would only pull in records nobody asked for
+        self.mmap.madvise(mmap.MADV_RANDOM)
+        if exists:
+            self.refresh()
+
+    def refresh(self):
+        # Picks up the transitions flushed by the writing process
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path) as f:
+                metadata = json.load(f)
+            self.position = metadata['position']
+            self.size = metadata['size']
+
+    def add(self, experience):
+        super().add(experience)
+        self._touch(1)
+
+    def add_records(self, records):
+        super().add_records(records)
+        self._touch(len(records))
+
+    def _touch(self, count):
+        self.touched += count
+        if self.touched >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        # Writes dirty pages and the metadata, then unmaps the pages so resident memory stays bounded
+        # whatever the buffer size, they remain in the page cache for the next gather
+        if not self.readonly:
+            self.mmap.flush()
+            temporary_path = self.metadata_path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                json.dump({'position': self.position, 'size': self.size}, f)
+            os.replace(temporary_path, self.metadata_path)
+        self.mmap.madvise(mmap.MADV_DONTNEED)
+        self.touched = 0
+
+    def sample(self, batch_size):
+        # Sorted indices turn the gather into one forward pass over the file, the order of a uniform
+        # minibatch does not matter
+        indices = np.sort(self.rng.integers(0, self.size, size=batch_size))
+        self._touch(batch_size)
+        return self.gather(indices)
+
+    def state_dict(self):
+        # Only the ring state, the records stay in the file and keep changing after the checkpoint.
+        # Resuming is exact only while the buffer has never been full: once it is, every add after the
+        # checkpoint overwrites a record the checkpoint counted on, and the resumed run samples from
+        # those newer records instead.
+        self.flush()
+        return {'path': self.path, 'position': self.position, 'size': self.size, 'rng': self.rng.bit_generator.state}
+
+    def load_state_dict(self, state):
+        if 'storage' in state:
+            super().load_state_dict(state)
+            return
+        if os.path.abspath(state['path']) != os.path.abspath(self.path):
+            raise ValueError(f"Checkpoint refers to the replay file {state['path']}, not {self.path}")
+        self.position = state['position']
+        self.size = state['size']
+        self.rng.bit_generator.state = state['rng']
+
+
+class SumTree:
+    # Binary tree of priority sums over a flat array, leaf i is stored at capacity + i
+    def __init__(self, capacity):
+        self.depth = max(1, (capacity - 1).bit_length())
+        self.capacity = 1 << self.depth
+        self.nodes = np.zeros(2 * self.capacity)
+
+    def total(self):
+        return self.nodes[1]
+
+    def priorities(self, indices):
+        return self.nodes[indices + self.capacity]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices) + self.capacity
+        self.nodes[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, values):
+        # Leaf whose prefix-sum interval holds each value, all values descend together
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.nodes[left]
+            go_right = values > left_sums
+            values = np.where(go_right, values - left_sums, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.capacity
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    # Proportional prioritized replay, transitions are sampled with probability p^alpha
+    def __init__(self, buffer_size, alpha=0.6, beta_start=0.4, beta_steps=100000, seed=None):
+        super().__init__(buffer_size, seed)
+        self.tree = SumTree(buffer_size)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_steps = beta_steps
+        self.sample_steps = 0
+        self.max_priority = 1.0
+        self.priority_epsilon = 1e-3  # Keeps zero TD error transitions reachable
+
+    def add(self, experience):
+        index = self.position
+        super().add(experience)
+        self.tree.update([index], self.max_priority ** self.alpha)
+
+    def add_records(self, records):
+        indices = (self.position + np.arange(len(records))) % self.buffer_size
+        super().add_records(records)
+        self.tree.update(indices, self.max_priority ** self.alpha)
+
+    def beta(self):
+        # Annealed from beta_start to 1 over beta_steps sample calls
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.sample_steps / self.beta_steps)
+
+    def sample(self, batch_size):
+        # Stratified sampling, one draw from each of batch_size equal slices of the total priority
+        import torch
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(np.minimum(values, total * (1 - 1e-12))), self.size - 1)
+
+        probabilities = self.tree.priorities(indices) / total
+        weights = (self.size * probabilities) ** -self.beta()
+        weights /= weights.max()
+        self.sample_steps += 1
+        return self.gather(indices), indices, torch.from_numpy(weights.astype(np.float32))
+
+    def state_dict(self):
+        state = super().state_dict()
+        state['tree'] = self.tree.nodes.copy()
+        state['sample_steps'] = self.sample_steps
+        state['max_priority'] = self.max_priority
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree.nodes[:] = state['tree']
+        self.sample_steps = state['sample_steps']
+        self.max_priority = state['max_priority']
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.priority_epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
@@ -0,0 +1,198 @@
+import argparse
+import time
+import numpy as np
+from environment import OkeyEnvironment
+from evaluate import compare, confidence_interval, generate_deals, play_deals
+from hand_tables import NUM_CARDS, VALID_ACTION_MASKS, hand_rows
+from numpy_policy import load_policy
+from solver import ACTION_REWARDS, is_terminal, successors, valid_actions
+
+# Anytime expectimax for move suggestions. Player nodes take the best action, chance nodes average
+# over every equally likely draw from the unseen cards (solver.successors), and positions at the depth
+# limit are scored by a leaf evaluator, 0 or the best Q-value of a trained network. Iterative
+# deepening runs depth 1, 2, ... until the time or node budget is spent and answers with the deepest
+# finished iteration, so a move is ready at most about one batch of leaves after the budget.
+# Positions are cached across iterations and moves in a transposition table keyed on (hand, deck),
+# with the depth they were searched to, EXACT when every line below them reached the end of the game.
+
+EXACT = NUM_CARDS + 1
+BITS = 1 << np.arange(NUM_CARDS)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def position_of(state):
+    # (hand mask, deck mask) of an observation, the deck being every unseen card
+    cards = np.asarray(state).reshape(NUM_CARDS, 3)
+    return int(BITS[cards[:, 1] > 0].sum()), int(BITS[cards[:, 0] > 0].sum())
+
+
+def observations(hands, decks):
+    # Observations of (hand, deck) positions, every other card is discarded
+    in_hand = (np.asarray(hands, dtype=np.int64)[:, None] & BITS) != 0
+    in_deck = (np.asarray(decks, dtype=np.int64)[:, None] & BITS) != 0
+    return np.stack([in_deck, in_hand, ~(in_deck | in_hand)], axis=2).reshape(len(in_hand), -1).astype(np.float32)
+
+
+class SearchAgent:
+    def __init__(self, time_limit=0.1, node_limit=None, max_depth=NUM_CARDS, leaf_policy=None, table_size=2000000):
+        # leaf_policy: e.g. a NumpyDQNetwork, None scores the positions at the depth limit as 0
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.leaf_policy = leaf_policy
+        self.table_size = table_size
+        self.table = {}  # hand | deck << 24 -> (depth, value)
+        self.deadline = None
+        self.nodes = 0
+        self.cutoff = False  # Whether the current subtree hit the depth limit somewhere
+        self.last_depth = 0  # Depth of the deepest finished iteration of the last move
+
+    def act(self, state, valid_actions):
+        # Same interface as DQNAgent.act, valid_actions a list of actions or a boolean mask
+        valid_actions = np.asarray(valid_actions)
+        if valid_actions.dtype == bool:
+            valid_actions = np.flatnonzero(valid_actions)
+        hand, deck = position_of(state)
+        return self.search(hand, deck, [int(action) for action in valid_actions])
+
+    def search(self, hand, deck, actions=None):
+        actions = valid_actions(hand) if actions is None else actions
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        self.nodes = 0
+        if len(self.table) > self.table_size:
+            self.table = {}
+        # Highest immediate reward first, then each iteration starts with the best move of the last one
+        order = sorted(actions, key=lambda action: -ACTION_REWARDS[action])
+        best = self.leaf_action(hand, deck, order)
+        self.last_depth = 0
+        for depth in range(1, self.max_depth + 1):
+            self.cutoff = False
+            values = {}
+            try:
+                for action in order:
+                    values[action] = self.action_value(hand, deck, action, depth)
+            except SearchTimeout:
+                # The moves finished at this depth were all compared with the previous best move,
+                # which is searched first, so the best of them is already a better answer
+                if order[0] in values:
+                    best = max(values, key=values.get)
+                break
+            best = max(order, key=values.get)
+            self.last_depth = depth
+            if not self.cutoff:
+                break  # Every line reached the end of the game, deeper iterations change nothing
+            order.sort(key=lambda action: -values[action])
+        return best
+
+    def leaf_action(self, hand, deck, order):
+        # Answer of depth 0: the leaf policy's greedy move, or the highest immediate reward
+        if self.leaf_policy is None:
+            return order[0]
+        q_values = self.leaf_policy.q_values(observations([hand], [deck]))[0]
+        return max(order, key=lambda action: q_values[action])
+
+    def leaf_values(self, hands, decks):
+        if self.leaf_policy is None or not hands:
+            return np.zeros(len(hands))
+        q_values = self.leaf_policy.q_values(observations(hands, decks))
+        return np.where(VALID_ACTION_MASKS[hand_rows(np.array(hands))], q_values, -np.inf).max(axis=1)
+
+    def action_value(self, hand, deck, action, depth):
+        reward, outcomes = successors(hand, deck, action)
+        if depth > 1:
+            return reward + sum(self.value(*outcome, depth - 1) for outcome in outcomes) / len(outcomes)
+        # Every outcome is a leaf or already in the table, the leaves are evaluated in one batch
+        self.check_deadline()
+        total = 0.0
+        leaf_hands, leaf_decks = [], []
+        for next_hand, next_deck in outcomes:
+            if is_terminal(next_hand, next_deck):
+                continue
+            entry = self.table.get(next_hand | next_deck << NUM_CARDS)
+            if entry is not None:
+                total += entry[1]
+                if entry[0] != EXACT:
+                    self.cutoff = True
+            else:
+                leaf_hands.append(next_hand)
+                leaf_decks.append(next_deck)
+        if leaf_hands:
+            self.cutoff = True
+            total += self.leaf_values(leaf_hands, leaf_decks).sum()
+        return reward + total / len(outcomes)
+
+    def check_deadline(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def value(self, hand, deck, depth):
+        if is_terminal(hand, deck):
+            return 0.0
+        key = hand | deck << NUM_CARDS
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            if entry[0] != EXACT:
+                self.cutoff = True
+            return entry[1]
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout
+        self.check_deadline()
+        outer_cutoff, self.cutoff = self.cutoff, False
+        value = max(self.action_value(hand, deck, action, depth) for action in valid_actions(hand))
+        self.table[key] = (depth if self.cutoff else EXACT, value)
+        self.cutoff |= outer_cutoff
+        return value
+
+
+def play_search_deals(agent, deals):
+    # Plays every deal once with the search agent, the scores and the time and depth of every move
+    env = OkeyEnvironment()
+    scores, move_times, depths = [], [], []
+    for deal in deals:
+        state = env.reset(deal)
+        score = 0
+        done = False
+        while not done:
+            start = time.perf_counter()
+            action = agent.act(state, env.valid_action_mask())
+            move_times.append(time.perf_counter() - start)
+            depths.append(agent.last_depth)
+            state, reward, done = env.step(action)
+            score += reward
+        scores.append(score)
+    return np.array(scores), np.array(move_times), np.array(depths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expectimax search agent on the fixed deal suite of evaluate.py")
+    parser.add_argument('--model', help="Network scoring the positions at the depth limit, and the greedy "
+                                        "policy the search is compared with")
+    parser.add_argument('--deals', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the deal suite")
+    parser.add_argument('--time-limit', type=float, default=0.1, help="Seconds per move")
+    parser.add_argument('--node-limit', type=int, help="Expanded positions per move")
+    args = parser.parse_args()
+
+    deals = generate_deals(args.deals, args.seed)
+    policy = load_policy(args.model) if args.model else None
+    agent = SearchAgent(args.time_limit, args.node_limit, leaf_policy=policy)
+    start = time.perf_counter()
+    scores, move_times, depths = play_search_deals(agent, deals)
+    print(f"search: {scores.mean():.2f} ± {confidence_interval(scores):.2f} (95% CI) over {len(deals)} deals "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"  move time p50 {np.percentile(move_times, 50) * 1000:.1f} ms, p99 {np.percentile(move_times, 99) * 1000:.1f} ms, "
+          f"max {move_times.max() * 1000:.1f} ms, mean depth {depths.mean():.2f}")
+    if policy is not None:
+        reference = play_deals(policy, deals)[0]
+        comparison = compare(scores, reference)
+        print(f"  vs greedy {args.model} ({reference.mean():.2f}): {comparison['mean_difference']:+.2f} ± "
+              f"{comparison['difference_ci95']:.2f}, better on {comparison['better']:.1%} of deals, "
+              f"worse on {comparison['worse']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
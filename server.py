@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+import numpy as np
+from environment import OkeyEnvironment
+from numpy_policy import load_policy
+from play import parse_new_card_input, number_to_color
+from traces import TraceWriter
+
+# Move suggestions for many concurrent games. Every game id has its own OkeyEnvironment session,
+# suggestion requests of all sessions are coalesced into one batched forward pass of the network,
+# and sessions without a request for idle_timeout seconds are dropped.
+#
+# Requests and responses are JSON lines, over TCP or stdin/stdout, answered as soon as they are done
+# (not in request order), the optional "id" of a request is echoed back:
+#   {"op": "start", "game": "g1", "hand": ["r,1", "y,4", "b,4", "r,7", "b,8"]}
+#   {"op": "suggest", "game": "g1"}                        -> action, cards, points
+#   {"op": "play", "game": "g1", "action": 9, "draw": ["y,2", "b,1", "r,5"]}
+#                                                          -> points, total, hand, deck, done
+#   {"op": "end", "game": "g1"}
+#   {"op": "stats"}
+# "draw" lists the cards drawn after the move, as many as "draw_next" of the suggest response.
+
+
+def parse_card(text):
+    card = parse_new_card_input(text)
+    if not 1 <= card[1] <= 8:
+        raise ValueError(f"Unknown card {text!r}")
+    return card
+
+
+def format_card(card):
+    color, number = card
+    return f"{number_to_color[color]},{number}"
+
+
+class InferenceBatcher:
+    # Queues single states and answers them with batched act_batch calls, a batch runs once max_batch
+    # states are waiting or max_delay seconds after its first state arrived
+    def __init__(self, policy, max_batch=256, max_delay=0.001):
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def suggest(self, state, valid_mask):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((state, valid_mask, future))
+        if len(self.pending) >= self.max_batch:
+            self.run_batch()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self.run_batch)
+        return future
+
+    def run_batch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending = self.pending, []
+        states = np.stack([item[0] for item in pending])
+        actions = self.policy.act_batch(states, np.stack([item[1] for item in pending]))
+        for (_, _, future), action in zip(pending, actions):
+            if not future.done():
+                future.set_result(int(action))
+        self.num_requests += len(pending)
+        self.num_batches += 1
+
+
+class Session:
+    def __init__(self, hand):
+        self.env = OkeyEnvironment()
+        self.env.set_hand(hand)
+        self.total_points = 0
+        self.actions, self.rewards = [], []
+        self.last_used = time.monotonic()
+        # Requests on one game run in arrival order, a play cannot change the hand under a pending suggest
+        self.lock = asyncio.Lock()
+
+
+class AdvisoryServer:
+    def __init__(self, policy, max_batch=256, max_delay=0.001, idle_timeout=600.0, trace_path=None):
+        self.batcher = InferenceBatcher(policy, max_batch, max_delay)
+        self.sessions = {}
+        self.idle_timeout = idle_timeout
+        self.num_evicted = 0
+        self.trace_writer = TraceWriter(trace_path) if trace_path is not None else None
+
+    def session(self, request):
+        session = self.sessions.get(request.get('game'))
+        if session is None:
+            raise ValueError(f"Unknown game {request.get('game')!r}")
+        session.last_used = time.monotonic()
+        return session
+
+    async def handle(self, request):
+        op = request.get('op')
+        if op == 'start':
+            hand = [parse_card(card) for card in request['hand']]
+            if len(hand) != 5 or len(set(hand)) != 5:
+                raise ValueError("A starting hand is 5 different cards")
+            self.sessions[request['game']] = session = Session(hand)
+            return {'hand': [format_card(card) for card in session.env.hand], 'deck': len(session.env.deck_cards)}
+        if op == 'suggest':
+            session = self.session(request)
+            async with session.lock:
+                return await self.suggest(session.env)
+        if op == 'play':
+            session = self.session(request)
+            async with session.lock:
+                return self.play(session, request)
+        if op == 'end':
+            self.end(request['game'])
+            return {}
+        if op == 'stats':
+            return {'sessions': len(self.sessions), 'evicted': self.num_evicted,
+                    'suggestions': self.batcher.num_requests, 'batches': self.batcher.num_batches}
+        raise ValueError(f"Unknown op {op!r}")
+
+    async def suggest(self, env):
+        action = await self.batcher.suggest(env.get_state(), env.valid_action_mask())
+        if action < 20:
+            cards = env.combination_cards(action)
+        else:
+            cards = [env.get_card_from_action_index(action)]
+        return {'action': action, 'cards': [format_card(card) for card in cards],
+                'points': env.calculate_reward_for_action(action, same_color=action < 14),
+                'draw_next': env.cards_to_draw(action)}
+
+    def play(self, session, request):
+        # Everything is checked before the session changes, a rejected move leaves it as it was
+        env = session.env
+        action = int(request['action'])
+        if not 0 <= action < env.action_size or not env.valid_action_mask()[action]:
+            raise ValueError(f"Action {action} is not valid for this hand")
+        drawn = [parse_card(card) for card in request.get('draw', [])]
+        if len(drawn) != env.cards_to_draw(action):
+            raise ValueError(f"Action {action} draws {env.cards_to_draw(action)} cards, got {len(drawn)}")
+        for card in drawn:
+            if card not in env.deck or drawn.count(card) > 1:
+                raise ValueError(f"{format_card(card)} is not in the deck")
+        points = env.apply_action(action)
+        for card in drawn:
+            env.draw_card(card)
+        session.total_points += points
+        session.actions.append(action)
+        session.rewards.append(points)
+        done = env.check_if_done()
+        if done:
+            self.end(request['game'])
+        return {'points': points, 'total': session.total_points, 'hand': [format_card(card) for card in env.hand],
+                'deck': len(env.deck_cards), 'done': done}
+
+    def end(self, game):
+        session = self.sessions.pop(game, None)
+        if session is not None and self.trace_writer is not None and session.env.check_if_done():
+            self.trace_writer.add_episode(session.env.played_deal(), session.actions, session.rewards)
+
+    async def evict_idle_sessions(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 4)
+            deadline = time.monotonic() - self.idle_timeout
+            for game in [game for game, session in self.sessions.items() if session.last_used < deadline]:
+                del self.sessions[game]
+                self.num_evicted += 1
+
+    async def respond(self, line, write):
+        request = {}
+        try:
+            request = json.loads(line)
+            response = await self.handle(request)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            response = {'error': str(e)}
+        if 'id' in request:
+            response['id'] = request['id']
+        if 'game' in request:
+            response['game'] = request['game']
+        write(json.dumps(response) + '\n')
+
+    async def serve_lines(self, reader, write):
+        # Every line is handled in its own task, so one connection can have many requests in flight
+        tasks = set()
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(self.respond(line, write))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            await self.serve_lines(reader, lambda data: writer.write(data.encode()))
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.trace_writer is not None:
+            self.trace_writer.close()
+
+
+async def serve_tcp(server, host, port):
+    evictor = asyncio.create_task(server.evict_idle_sessions())
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"Serving on {', '.join(str(sock.getsockname()) for sock in tcp_server.sockets)}", file=sys.stderr)
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        evictor.cancel()
+
+
+async def serve_stdio(server):
+    evictor = asyncio.create_task(server.evict_idle_sessions())
+    reader = asyncio.StreamReader()
+    await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    def write(data):
+        sys.stdout.write(data)
+        sys.stdout.flush()
+
+    try:
+        await server.serve_lines(reader, write)
+    finally:
+        evictor.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move suggestions for many concurrent games as JSON lines")
+    parser.add_argument('--model', default="dqn_model_v1.pth")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--stdio', action='store_true', help="Serve stdin/stdout instead of TCP")
+    parser.add_argument('--max-batch', type=int, default=256, help="Largest batch of one forward pass")
+    parser.add_argument('--max-delay-ms', type=float, default=1.0, help="Longest wait for a batch to fill")
+    parser.add_argument('--idle-timeout', type=float, default=600.0, help="Seconds before an idle game is dropped")
+    parser.add_argument('--trace', help="Append finished games to this trace file")
+    parser.add_argument('--canonical-colors', action='store_true',
+                        help="The model was trained with Config.canonical_colors")
+    args = parser.parse_args()
+
+    server = AdvisoryServer(load_policy(args.model, args.canonical_colors), args.max_batch, args.max_delay_ms / 1000,
+                            args.idle_timeout, args.trace)
+    try:
+        asyncio.run(serve_stdio(server) if args.stdio else serve_tcp(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import itertools
+import os
+import random
+import time
+import numpy as np
+from environment import OkeyEnvironment
+from hand_tables import (
+    NUM_CARDS, HAND_ROWS, COMBINATION_BITS_LIST, REMOVED_CARDS, SAME_NUMBER_OR_COLOR_BITS, mask_to_indices,
+)
+from symmetry import COLOR_PERMUTATIONS, canonical_position, permute_action
+
+# Expectimax over the real game: the player picks an action, then the cards drawn from the
+# remaining deck are a uniformly random subset. A position is (hand mask, deck mask), the
+# discarded cards are everything else and never matter again.
+
+ACTION_REWARDS = [OkeyEnvironment.calculate_reward_for_action(None, action, same_color=action < 14)
+                  for action in range(44)]
+REMOVED_CARDS_LIST = REMOVED_CARDS.tolist()
+
+
+def deck_mask_of(env):
+    mask = 0
+    for index in env.deck_cards:
+        mask |= 1 << index
+    return mask
+
+
+def is_terminal(hand, deck):
+    # Same rule as OkeyEnvironment.check_if_done
+    if hand == 0:
+        return True
+    return deck == 0 and not COMBINATION_BITS_LIST[HAND_ROWS[hand]] & SAME_NUMBER_OR_COLOR_BITS
+
+
+def valid_actions(hand):
+    row = HAND_ROWS[hand]
+    bits = COMBINATION_BITS_LIST[row]
+    return [action for action in range(20) if bits >> action & 1] + [20 + card for card in mask_to_indices(hand)]
+
+
+def successors(hand, deck, action):
+    # Reward of the action and the equally likely (hand, deck) positions after the draw
+    if action < 20:
+        removed = REMOVED_CARDS_LIST[HAND_ROWS[hand]][action]
+        num_cards_to_draw = 3
+    else:
+        removed = 1 << (action - 20)
+        num_cards_to_draw = 1
+    hand &= ~removed
+    deck_cards = mask_to_indices(deck)
+    num_cards_to_draw = min(num_cards_to_draw, len(deck_cards))
+    outcomes = []
+    for drawn in itertools.combinations(deck_cards, num_cards_to_draw):
+        drawn_mask = 0
+        for index in drawn:
+            drawn_mask |= 1 << index
+        outcomes.append((hand | drawn_mask, deck & ~drawn_mask))
+    return ACTION_REWARDS[action], outcomes
+
+
+class OptimalSolver:
+    def __init__(self, table_path=None, use_color_symmetry=False):
+        # use_color_symmetry merges positions that only differ by a colour permutation, up to 6 times
+        # fewer entries. It is off by default: a different-colour run uses the lowest colour copy of
+        # each number (see hand_tables), so swapping colours can change which card is kept and the
+        # merged values are then only approximate.
+        self.use_color_symmetry = use_color_symmetry
+        self.memo = {}  # key -> (value, best action in the key's colour frame)
+        self.table_keys = np.zeros(0, dtype=np.uint64)
+        self.table_values = np.zeros(0)
+        self.table_actions = np.zeros(0, dtype=np.int8)
+        if table_path is not None and os.path.exists(table_path):
+            self.load(table_path)
+
+    def canonical(self, hand, deck):
+        # Smallest key over the colour permutations and the permutation that produces it
+        if not self.use_color_symmetry:
+            return hand | deck << NUM_CARDS, COLOR_PERMUTATIONS[0]
+        return canonical_position(hand, deck)
+
+    def _lookup(self, key):
+        entry = self.memo.get(key)
+        if entry is None and len(self.table_keys):
+            row = np.searchsorted(self.table_keys, key)
+            if row < len(self.table_keys) and self.table_keys[row] == key:
+                entry = (float(self.table_values[row]), int(self.table_actions[row]))
+        return entry
+
+    def solve(self, hand, deck):
+        # Optimal expected points from a position and the action that reaches them
+        if is_terminal(hand, deck):
+            return 0.0, None
+        key, permutation = self.canonical(hand, deck)
+        entry = self._lookup(key)
+        if entry is None:
+            hand_key, deck_key = key & 0xFFFFFF, key >> NUM_CARDS
+            action_values = self._action_values(hand_key, deck_key)
+            best_action = max(action_values, key=action_values.get)
+            entry = (action_values[best_action], best_action)
+            self.memo[key] = entry
+        value, action = entry
+        inverse = [permutation.index(color) for color in range(3)]
+        return value, permute_action(action, inverse)
+
+    def value(self, hand, deck):
+        return self.solve(hand, deck)[0]
+
+    def _action_values(self, hand, deck):
+        action_values = {}
+        for action in valid_actions(hand):
+            reward, outcomes = successors(hand, deck, action)
+            expected = 0.0
+            for next_hand, next_deck in outcomes:
+                if not is_terminal(next_hand, next_deck):
+                    expected += self.solve(next_hand, next_deck)[0]
+            action_values[action] = reward + expected / len(outcomes)
+        return action_values
+
+    def action_values(self, hand, deck):
+        # Optimal Q-values of every valid action, in the caller's colour frame
+        return self._action_values(hand, deck)
+
+    def regret(self, hand, deck, action):
+        action_values = self.action_values(hand, deck)
+        return max(action_values.values()) - action_values[action]
+
+    def save(self, path):
+        # Merges the memo into the sorted on-disk table, np.load reads it back in milliseconds
+        keys = np.concatenate([self.table_keys, np.fromiter(self.memo.keys(), dtype=np.uint64, count=len(self.memo))])
+        values = np.concatenate([self.table_values,
+                                 np.array([entry[0] for entry in self.memo.values()])])
+        actions = np.concatenate([self.table_actions,
+                                  np.array([entry[1] for entry in self.memo.values()], dtype=np.int8)])
+        order = np.argsort(keys, kind='stable')
+        keys, values, actions = keys[order], values[order], actions[order]
+        unique = np.ones(len(keys), dtype=bool)
+        unique[1:] = keys[1:] != keys[:-1]
+        np.savez(path, keys=keys[unique], values=values[unique], actions=actions[unique],
+                 use_color_symmetry=self.use_color_symmetry)
+        self.table_keys, self.table_values, self.table_actions = keys[unique], values[unique], actions[unique]
+        self.memo = {}
+
+    def load(self, path):
+        with np.load(path) as table:
+            if bool(table['use_color_symmetry']) != self.use_color_symmetry:
+                raise ValueError(f"{path} was solved with use_color_symmetry={bool(table['use_color_symmetry'])}")
+            self.table_keys = table['keys']
+            self.table_values = table['values']
+            self.table_actions = table['actions']
+
+
+def regret_report(policy, solver, num_games=100, max_deck_size=6, seed=0):
+    # Plays policy(env, state, valid_actions) -> action and scores every move made once the deck has
+    # at most max_deck_size cards, earlier positions are too large to solve exactly in Python
+    env = OkeyEnvironment(seed=seed)  # Its own generator, the caller's random state is left alone
+    regrets = []
+    for _ in range(num_games):
+        state = env.reset()
+        for t in range(25):
+            valid = env.get_valid_actions()
+            action = policy(env, state, valid)
+            if len(env.deck_cards) <= max_deck_size:
+                regrets.append(solver.regret(env.hand_mask, deck_mask_of(env), action))
+            state, _, done = env.step(action)
+            if done:
+                break
+    regrets = np.array(regrets)
+    return {
+        'moves': len(regrets),
+        'mean_regret': float(regrets.mean()) if len(regrets) else 0.0,
+        'optimal_move_rate': float((regrets < 1e-6).mean()) if len(regrets) else 1.0,
+        'total_regret_per_game': float(regrets.sum() / num_games),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact expectimax values and per-move regret of a policy")
+    parser.add_argument('--model', help="DQN weights to score, a uniformly random policy when omitted")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--max-deck-size', type=int, default=6)
+    parser.add_argument('--table', default='solver_table.npz', help="Solved positions, loaded and extended")
+    parser.add_argument('--color-symmetry', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    solver = OptimalSolver(args.table, use_color_symmetry=args.color_symmetry)
+    print(f"Loaded {len(solver.table_keys)} solved positions in {time.perf_counter() - start:.3f}s")
+
+    if args.model:
+        import torch
+        from agent import DQNAgent
+        from config import Config
+        agent = DQNAgent(72, 44, Config())
+        agent.model.load_state_dict(torch.load(args.model))
+        agent.epsilon = 0.0
+        policy = lambda env, state, valid: agent.act(state, valid)
+    else:
+        player = random.Random(args.seed)
+        policy = lambda env, state, valid: player.choice(valid)
+
+    start = time.perf_counter()
+    report = regret_report(policy, solver, args.games, args.max_deck_size, args.seed)
+    print(f"Solved {len(solver.memo)} new positions in {time.perf_counter() - start:.1f}s")
+    for name, value in report.items():
+        print(f"{name}: {value}")
+    solver.save(args.table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+import numpy as np
+
+# Asynchronous successive halving (ASHA) over Config fields. Every trial starts with a budget of
+# min_episodes, a trial is promoted to the next budget (eta times larger) once it is in the top 1/eta
+# of the trials finished at its current budget. Promoted trials continue from their checkpoint, the
+# others are never run further, so most of the compute goes to the promising configurations.
+
+# The fields marked "TODO This field shall be tuned" in config.py, num_episodes is the sweep budget
+DEFAULT_SEARCH_SPACE = {
+    'learning_rate': {'loguniform': [1e-5, 1e-3]},
+    'lr_decay': {'choice': [1.0, 0.9999, 0.9997]},
+    'epsilon_decay': {'choice': [0.999, 0.9994, 0.9997]},
+    'target_update': {'choice': [100, 400, 800, 1600]},
+}
+
+
+def check_search_space(space, config):
+    # A misspelt field would only become a new attribute that training never reads
+    unknown = [field for field in space if not hasattr(config, field)]
+    if unknown:
+        raise ValueError(f"Unknown Config fields in the search space: {', '.join(unknown)}")
+
+
+def sample_params(space, rng):
+    params = {}
+    for field, distribution in space.items():
+        (kind, values), = distribution.items()
+        if kind == 'choice':
+            params[field] = rng.choice(values)
+        elif kind == 'uniform':
+            params[field] = rng.uniform(*values)
+        elif kind == 'loguniform':
+            params[field] = math.exp(rng.uniform(math.log(values[0]), math.log(values[1])))
+        else:
+            raise ValueError(f"Unknown distribution {kind} for {field}")
+    return params
+
+
+def rung_budgets(min_episodes, max_episodes, eta):
+    budgets = [min_episodes]
+    while budgets[-1] * eta <= max_episodes:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+def pin_worker(cores):
+    # Each pool process takes one core for itself, with torch kept to a single thread on it
+    core = cores.get()
+    os.sched_setaffinity(0, {core})
+    import torch
+    torch.set_num_threads(1)
+
+
+def run_trial(trial_id, params, num_episodes, min_episodes, trial_dir, seed):
+    # Trains one trial up to num_episodes, continuing from its last checkpoint when it was promoted
+    import torch
+    from agent import DQNAgent
+    from checkpoint import latest_checkpoint
+    from config import Config
+    from environment import OkeyEnvironment
+    from train import train_agent
+
+    config = Config()
+    for field, value in params.items():
+        setattr(config, field, value)
+    config.num_episodes = num_episodes
+    config.model_save_path = os.path.join(trial_dir, 'model.pth')
+    config.metrics_path = os.path.join(trial_dir, f'metrics_{num_episodes}.jsonl')
+    config.console_log_interval = 0
+    config.checkpoint_dir = trial_dir
+    config.checkpoint_interval = min_episodes  # Every budget is a multiple of it
+    config.checkpoint_keep = 1
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    env = OkeyEnvironment()
+    agent = DQNAgent(env.state_size, env.action_size, config)
+
+    start = time.perf_counter()
+    os.makedirs(trial_dir, exist_ok=True)
+    with open(os.path.join(trial_dir, 'train.log'), 'a') as log, contextlib.redirect_stdout(log):
+        scores = train_agent(env, agent, config, latest_checkpoint(trial_dir))
+    # The rolling 100-episode mean train_agent reports
+    return float(np.mean(scores[-100:])), time.perf_counter() - start
+
+
+class AshaScheduler:
+    def __init__(self, num_trials, budgets, eta):
+        self.num_trials = num_trials
+        self.budgets = budgets
+        self.eta = eta
+        self.num_started = 0
+        self.scores = [{} for _ in budgets]  # rung -> {trial id: score}
+        self.promoted = [set() for _ in budgets]
+
+    def next_job(self):
+        # Promotion from the highest rung first, otherwise a new trial, (trial id, rung) or None
+        for rung in range(len(self.budgets) - 2, -1, -1):
+            ranked = sorted(self.scores[rung], key=self.scores[rung].get, reverse=True)
+            for trial_id in ranked[:len(ranked) // self.eta]:
+                if trial_id not in self.promoted[rung]:
+                    self.promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+        if self.num_started < self.num_trials:
+            self.num_started += 1
+            return self.num_started - 1, 0
+        return None
+
+    def report(self, trial_id, rung, score):
+        self.scores[rung][trial_id] = score
+
+
+def write_table(path, rows, fields):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['trial', 'episodes', 'score', 'seconds'] + fields)
+        writer.writeheader()
+        for row in sorted(rows, key=lambda row: (-row['episodes'], -row['score'])):
+            writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASHA hyperparameter sweep over Config fields")
+    parser.add_argument('--space', help="JSON search space, inline or the path of a JSON file, "
+                                        "e.g. '{\"learning_rate\": {\"loguniform\": [1e-5, 1e-3]}}'")
+    parser.add_argument('--trials', type=int, default=27)
+    parser.add_argument('--min-episodes', type=int, default=300)
+    parser.add_argument('--max-episodes', type=int, help="Largest budget, Config.num_episodes by default")
+    parser.add_argument('--eta', type=int, default=3, help="Promotion ratio between budgets")
+    parser.add_argument('--workers', type=int, help="Parallel trials, one per available core by default")
+    parser.add_argument('--output-dir', default='sweep')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from config import Config
+    max_episodes = args.max_episodes or Config().num_episodes
+    space = DEFAULT_SEARCH_SPACE
+    if args.space and args.space.lstrip().startswith('{'):
+        space = json.loads(args.space)
+    elif args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    try:
+        check_search_space(space, Config())
+    except ValueError as e:
+        parser.error(str(e))
+    budgets = rung_budgets(args.min_episodes, max_episodes, args.eta)
+    cores = sorted(os.sched_getaffinity(0))
+    num_workers = min(args.workers or len(cores), len(cores))
+    print(f"Budgets {budgets}, {args.trials} trials on {num_workers} cores")
+
+    rng = random.Random(args.seed)
+    trial_params = [sample_params(space, rng) for _ in range(args.trials)]
+    scheduler = AshaScheduler(args.trials, budgets, args.eta)
+    os.makedirs(args.output_dir, exist_ok=True)
+    table_path = os.path.join(args.output_dir, 'results.csv')
+    rows = []
+    episodes_run = 0
+
+    ctx = mp.get_context('spawn')
+    core_queue = ctx.Queue()
+    for core in cores[:num_workers]:
+        core_queue.put(core)
+    with concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=ctx, initializer=pin_worker,
+                                                initargs=(core_queue,)) as pool:
+        running = {}
+        while True:
+            while len(running) < num_workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                future = pool.submit(run_trial, trial_id, trial_params[trial_id], budgets[rung], args.min_episodes,
+                                     os.path.join(args.output_dir, f'trial_{trial_id:03d}'), args.seed + trial_id)
+                running[future] = job
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                trial_id, rung = running.pop(future)
+                score, seconds = future.result()
+                scheduler.report(trial_id, rung, score)
+                episodes_run += budgets[rung] - (budgets[rung - 1] if rung else 0)
+                rows.append({'trial': trial_id, 'episodes': budgets[rung], 'score': round(score, 2),
+                             'seconds': round(seconds, 1), **trial_params[trial_id]})
+                write_table(table_path, rows, list(space))
+                print(f"trial {trial_id} at {budgets[rung]} episodes: {score:.2f} ({seconds:.0f}s)")
+
+    best = max(rows, key=lambda row: (row['episodes'], row['score']))
+    print(f"Best: trial {best['trial']} with {best['score']} after {best['episodes']} episodes, "
+          f"{ {field: best[field] for field in space} }")
+    print(f"{episodes_run} episodes trained, {args.trials * budgets[-1]} for the same trials run to the full budget")
+    print(f"Results in {table_path}")
+
+
+if __name__ == "__main__":
+    main()
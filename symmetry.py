@@ -0,0 +1,140 @@
+import itertools
+import numpy as np
+from hand_tables import NUM_CARDS, NUM_COMBINATIONS
+from replay_buffer import pack_bits, unpack_bits
+
+# Colour symmetry of the game. Rewards never depend on the colour of a card, so a position and its
+# colour permutations (up to 6) are worth the same, except for one tie-break: a different-colour run
+# uses the lowest colour copy of each number (see hand_tables), so permuting the colours can change
+# which copy stays in the hand. The canonical forms below are exact relabellings, values shared
+# between the positions of one canonical form are only approximately equal in that case.
+#
+# Observations (3 colors, 8 numbers, 3 states) are put in canonical colour order by sorting the
+# colours on their 8 card states, actions 0-19 name no colour and discards 20-43 follow their card.
+
+COLOR_PERMUTATIONS = list(itertools.permutations(range(3)))
+CARD_STATE_WEIGHTS = np.array([0, 1, 2])  # In deck, in hand, discarded
+NUMBER_WEIGHTS = 3 ** np.arange(8)
+
+
+def permute_colors(mask, permutation):
+    # Moves the cards of color c to color permutation[c]
+    return sum(((mask >> (8 * color)) & 0xFF) << (8 * permutation[color]) for color in range(3))
+
+
+def permute_action(action, permutation):
+    # Combination actions do not name a color, discards follow their card
+    if action < NUM_COMBINATIONS:
+        return action
+    card = action - NUM_COMBINATIONS
+    return NUM_COMBINATIONS + 8 * permutation[card // 8] + card % 8
+
+
+def canonical_position(hand, deck):
+    # Smallest (hand, deck) key over the colour permutations, the key is hand | deck << 24, and the
+    # permutation that produces it
+    best_key, best_permutation = None, None
+    for permutation in COLOR_PERMUTATIONS:
+        key = permute_colors(hand, permutation) | permute_colors(deck, permutation) << NUM_CARDS
+        if best_key is None or key < best_key:
+            best_key, best_permutation = key, permutation
+    return best_key, best_permutation
+
+
+def canonical_color_order(states):
+    # (N, 3) original colours in canonical order, the colours sorted by the states of their cards.
+    # Colours with identical cards tie, any order of them gives the same canonical observation.
+    card_states = np.asarray(states).reshape(-1, 3, 8, 3) @ CARD_STATE_WEIGHTS
+    keys = card_states @ NUMBER_WEIGHTS
+    return np.argsort(-keys, axis=1, kind='stable')
+
+
+def permute_states(states, order):
+    # Observations with colour order[:, j] moved to colour j
+    rows = np.arange(len(order))[:, None]
+    return np.asarray(states).reshape(-1, 3, 24)[rows, order].reshape(len(order), -1)
+
+
+def permute_masks(masks, order):
+    # Valid action masks of permute_states(states, order)
+    rows = np.arange(len(order))[:, None]
+    masks = np.asarray(masks)
+    discards = masks[:, NUM_COMBINATIONS:].reshape(-1, 3, 8)[rows, order].reshape(len(order), -1)
+    return np.concatenate([masks[:, :NUM_COMBINATIONS], discards], axis=1)
+
+
+def to_canonical_actions(actions, order):
+    # Actions of the original observations, in the colour frame of permute_states(states, order)
+    actions = np.asarray(actions)
+    cards = np.maximum(actions - NUM_COMBINATIONS, 0)
+    colors = np.argsort(order, axis=1)[np.arange(len(actions)), cards // 8]
+    return np.where(actions < NUM_COMBINATIONS, actions, NUM_COMBINATIONS + 8 * colors + cards % 8)
+
+
+def from_canonical_actions(actions, order):
+    # Inverse of to_canonical_actions
+    actions = np.asarray(actions)
+    cards = np.maximum(actions - NUM_COMBINATIONS, 0)
+    colors = order[np.arange(len(actions)), cards // 8]
+    return np.where(actions < NUM_COMBINATIONS, actions, NUM_COMBINATIONS + 8 * colors + cards % 8)
+
+
+def canonicalize(states, valid_masks=None):
+    # Canonical observations, their valid masks when given, and the colour order to map actions back
+    order = canonical_color_order(states)
+    states = permute_states(states, order)
+    if valid_masks is None:
+        return states, order
+    return states, permute_masks(valid_masks, order), order
+
+
+def canonicalize_minibatch(states, actions, next_states, next_masks):
+    # Transitions with state and action in the canonical frame of the state and next state and next
+    # mask in the canonical frame of the next state, the frames the agent acts in
+    states, order = canonicalize(states)
+    next_states, next_masks, _ = canonicalize(next_states, next_masks)
+    return states, to_canonical_actions(actions, order), next_states, next_masks
+
+
+def canonicalize_transitions(records):
+    # Packed replay records (TRANSITION_DTYPE) in canonical form, equal records are the same
+    # transition up to colours, e.g. np.unique(canonicalize_transitions(records)) to deduplicate
+    states, actions, next_states, next_masks = canonicalize_minibatch(
+        unpack_bits(records['state'], 72), records['action'], unpack_bits(records['next_state'], 72),
+        unpack_bits(records['next_mask'], 44).astype(bool))
+    canonical = records.copy()
+    canonical['state'] = pack_bits(states)
+    canonical['action'] = actions
+    canonical['next_state'] = pack_bits(next_states)
+    canonical['next_mask'] = pack_bits(next_masks)
+    return canonical
+
+
+class CanonicalColorPolicy:
+    # Wraps a policy with act_batch(states, valid_masks) that was trained on canonical observations,
+    # e.g. a NumpyDQNetwork of a model trained with Config.canonical_colors
+    def __init__(self, policy):
+        self.policy = policy
+        self.state_size = policy.state_size
+        self.action_size = policy.action_size
+
+    def q_values(self, states):
+        # Q-values of the wrapped policy, columns in the caller's colour frame
+        states = np.asarray(states)
+        canonical, order = canonicalize(states.reshape(-1, self.state_size))
+        actions = np.tile(np.arange(self.action_size), len(order))
+        columns = to_canonical_actions(actions, np.repeat(order, self.action_size, axis=0)).reshape(len(order), -1)
+        q_values = np.take_along_axis(self.policy.q_values(canonical), columns, axis=1)
+        return q_values.reshape(states.shape[:-1] + (self.action_size,))
+
+    def act_batch(self, states, valid_masks):
+        states, valid_masks, order = canonicalize(states, valid_masks)
+        return from_canonical_actions(self.policy.act_batch(states, valid_masks), order)
+
+    def act(self, state, valid_actions):
+        valid_actions = np.asarray(valid_actions)
+        if valid_actions.dtype != bool:
+            valid_mask = np.zeros(self.action_size, dtype=bool)
+            valid_mask[valid_actions] = True
+            valid_actions = valid_mask
+        return int(self.act_batch(np.asarray(state)[None], valid_actions[None])[0])
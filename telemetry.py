@@ -0,0 +1,143 @@
+import cProfile
+import csv
+import json
+import queue
+import threading
+import time
+
+# Training instrumentation. The hot loop only adds monotonic-clock deltas and counts into
+# preallocated dicts, every metrics_interval episodes they become one record that a background
+# thread appends to the metrics file, and only every console_log_interval-th record is printed.
+
+
+class MetricsWriter:
+    # Appends records to a JSONL file, or a CSV file when the path ends in .csv, off the training thread.
+    # append=True keeps the records already in the file, e.g. of the run being resumed.
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.records = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        self.records.put(record)
+
+    def _run(self):
+        with open(self.path, 'a' if self.append else 'w', newline='') as f:
+            csv_writer = None
+            new_file = f.tell() == 0
+            while True:
+                record = self.records.get()
+                if record is None:
+                    break
+                if self.path.endswith('.csv'):
+                    if csv_writer is None:
+                        csv_writer = csv.DictWriter(f, fieldnames=list(record))
+                        if new_file:
+                            csv_writer.writeheader()
+                    csv_writer.writerow(record)
+                else:
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+
+    def close(self):
+        self.records.put(None)
+        self.thread.join()
+
+
+class Telemetry:
+    def __init__(self, config, phases, counters=('env_steps', 'updates'), gauges=('epsilon', 'loss', 'buffer_fill'),
+                 append=False):
+        # Every record has the same fields, so the CSV header written from the first one stays valid
+        self.phase_times = dict.fromkeys(phases, 0.0)
+        self.counters = dict.fromkeys(counters, 0)
+        self.totals = dict.fromkeys(counters, 0)
+        self.gauges = dict.fromkeys(gauges)
+        self.rewards = []
+        self.metrics_interval = config.metrics_interval
+        self.console_log_interval = config.console_log_interval
+        self.num_records = 0
+        self.writer = MetricsWriter(config.metrics_path, append) if config.metrics_path else None
+
+        # Optional cProfile over the episodes first..last of config.profile_episodes
+        self.profile_episodes = config.profile_episodes
+        self.profile_path = config.profile_path
+        self.profiler = None
+
+        self.start_time = self.window_start = time.perf_counter()
+
+    def clock(self):
+        return time.perf_counter()
+
+    def lap(self, phase, since):
+        # Adds the time since `since` to a phase and returns the new start, one clock read per phase
+        now = time.perf_counter()
+        self.phase_times[phase] += now - since
+        return now
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def begin_episode(self, episode):
+        if self.profile_episodes is not None and episode == self.profile_episodes[0]:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def end_episode(self, episode, total_reward):
+        self.rewards.append(total_reward)
+        if self.profiler is not None and episode == self.profile_episodes[1]:
+            self._stop_profiler()
+        if len(self.rewards) >= self.metrics_interval:
+            self.flush(episode)
+
+    def _stop_profiler(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_path)
+        print(f"Profile of episodes {self.profile_episodes[0]}-{self.profile_episodes[1]} saved to {self.profile_path}")
+        self.profiler = None
+
+    def flush(self, episode):
+        # Turns the current window into a record and starts a new window
+        now = time.perf_counter()
+        window = now - self.window_start
+        record = {
+            'episode': episode,
+            'time_s': round(now - self.start_time, 3),
+            'reward_mean': sum(self.rewards) / len(self.rewards),
+        }
+        for name, value in self.counters.items():
+            self.totals[name] += value
+            record[name] = self.totals[name]
+            record[f'{name}_per_s'] = round(value / window, 1)
+        for phase, seconds in self.phase_times.items():
+            record[f'{phase}_s'] = round(seconds, 4)
+        record['other_s'] = round(window - sum(self.phase_times.values()), 4)
+        record.update(self.gauges)
+
+        if self.writer is not None:
+            self.writer.write(record)
+        if self.console_log_interval and self.num_records % self.console_log_interval == 0:
+            print(self.format(record))
+        self.num_records += 1
+
+        self.rewards = []
+        self.counters = dict.fromkeys(self.counters, 0)
+        self.phase_times = dict.fromkeys(self.phase_times, 0.0)
+        self.window_start = time.perf_counter()
+
+    def format(self, record):
+        rates = ', '.join(f"{name}/s: {record[f'{name}_per_s']:.0f}" for name in self.counters)
+        phases = ' '.join(f"{phase} {record[f'{phase}_s']:.2f}s" for phase in self.phase_times)
+        return f"{record['episode']}, {record['reward_mean']:.2f}, epsilon: {record['epsilon']:.4f}, {rates} | {phases}"
+
+    def close(self, episode):
+        if self.rewards:
+            self.flush(episode)
+        if self.profiler is not None:
+            self._stop_profiler()
+        if self.writer is not None:
+            self.writer.close()
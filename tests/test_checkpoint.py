@@ -0,0 +1,58 @@
+import random
+import numpy as np
+import pytest
+import torch
+from agent import DQNAgent
+from config import Config
+from environment import OkeyEnvironment
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer, pack_transitions
+from test_replay_buffer import random_transitions
+from train import train_agent
+
+
+def train(directory, num_episodes, resume_from=None, **overrides):
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+    config = Config()
+    config.num_episodes = num_episodes
+    config.buffer_size = 2000
+    config.batch_size = 16
+    config.metrics_path = None
+    config.checkpoint_dir = str(directory)
+    config.checkpoint_interval = 5
+    config.model_save_path = str(directory / 'model.pth')
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    env = OkeyEnvironment()
+    agent = DQNAgent(env.state_size, env.action_size, config)
+    scores = train_agent(env, agent, config, resume_from)
+    return scores, agent.model.state_dict()
+
+
+@pytest.mark.parametrize('overrides', [{}, {'prioritized_replay': True, 'n_step': 3}])
+def test_resume_matches_uninterrupted_run(tmp_path, overrides):
+    scores, weights = train(tmp_path / 'first', 12, **overrides)
+    repeated_scores, repeated_weights = train(tmp_path / 'second', 12, **overrides)
+    resumed_scores, resumed_weights = train(tmp_path / 'second', 12, str(tmp_path / 'first' / 'checkpoint_00000005.pt'),
+                                            **overrides)
+    assert repeated_scores == scores and resumed_scores == scores
+    for name in weights:
+        assert torch.equal(repeated_weights[name], weights[name])
+        assert torch.equal(resumed_weights[name], weights[name])
+
+
+@pytest.mark.parametrize('buffer_class', [ReplayBuffer, PrioritizedReplayBuffer])
+def test_buffer_state_dict_restores_sampling(buffer_class):
+    buffer = buffer_class(100, seed=1)
+    buffer.add_records(pack_transitions(*random_transitions(100)))
+    state = buffer.state_dict()
+    expected = buffer.sample(32)
+    restored = buffer_class(100, seed=2)
+    restored.load_state_dict(state)
+    for tensor, expected_tensor in zip(restored.sample(32), expected):
+        if isinstance(tensor, tuple):
+            for part, expected_part in zip(tensor, expected_tensor):
+                np.testing.assert_array_equal(part.numpy(), expected_part.numpy())
+        else:
+            np.testing.assert_array_equal(np.asarray(tensor), np.asarray(expected_tensor))
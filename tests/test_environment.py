@@ -0,0 +1,24 @@
+import random
+import numpy as np
+from environment import OkeyEnvironment
+
+
+def test_incremental_state_matches_full_encoding():
+    env = OkeyEnvironment(seed=0)
+    player = random.Random(0)
+    for _ in range(20):
+        env.reset()
+        done = False
+        while not done:
+            state, _, done = env.step(player.choice(env.get_valid_actions()))
+            env._rebuild_state()
+            np.testing.assert_array_equal(env.get_state(), state)
+
+
+def test_states_are_copies():
+    env = OkeyEnvironment(seed=1)
+    state = env.reset()
+    before = state.copy()
+    next_state, _, _ = env.step(env.get_valid_actions()[-1])
+    np.testing.assert_array_equal(state, before)
+    assert not np.array_equal(state, next_state)
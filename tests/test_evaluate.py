@@ -0,0 +1,29 @@
+import numpy as np
+from environment import OkeyEnvironment
+from evaluate import generate_deals, play_deals
+
+
+def test_seeded_deals_repeat():
+    assert OkeyEnvironment(seed=3).reset().tolist() == OkeyEnvironment(seed=3).reset().tolist()
+    first, second = OkeyEnvironment(seed=3), OkeyEnvironment()
+    first.reset()
+    second.reset(first.played_deal())
+    np.testing.assert_array_equal(first.get_state(), second.get_state())
+
+
+def test_deal_suite_depends_only_on_its_seed():
+    np.testing.assert_array_equal(generate_deals(50, seed=4), generate_deals(50, seed=4))
+    assert not (generate_deals(50, seed=4) == generate_deals(50, seed=5)).all()
+    assert (np.sort(generate_deals(50), axis=1) == np.arange(24)).all()
+
+
+def test_play_deals_repeats_scores():
+    deals = generate_deals(40)
+    scores, _, _, moves, move_rewards, lengths = play_deals(None, deals, seed=1)
+    np.testing.assert_array_equal(play_deals(None, deals, seed=1)[0], scores)
+    # The recorded moves replay to the same score in the scalar environment
+    env = OkeyEnvironment()
+    for deal, game_moves, length, score in zip(deals, moves, lengths, scores):
+        env.reset(deal)
+        assert sum(env.step(int(action))[1] for action in game_moves[:length]) == score
+    np.testing.assert_array_equal(move_rewards.sum(axis=1), scores)
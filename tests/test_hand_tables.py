@@ -0,0 +1,60 @@
+from math import comb
+import numpy as np
+import pytest
+from environment import OkeyEnvironment
+from hand_tables import HAND_MASKS, HAND_ROWS, VALID_ACTION_MASKS, REMOVED_CARDS, NUM_CARDS
+from vector_environment import VectorOkeyEnvironment
+
+
+def reference_actions(mask):
+    # Valid actions and removed cards of a hand, straight from the rules
+    held = {(index // 8, index % 8) for index in range(NUM_CARDS) if mask >> index & 1}
+    valid, removed = set(), {}
+    for n in range(8):
+        if all((color, n) in held for color in range(3)):
+            valid.add(n)
+            removed[n] = sum(1 << (8 * color + n) for color in range(3))
+    for i in range(6):
+        run_colors = [color for color in range(3) if all((color, n) in held for n in range(i, i + 3))]
+        if run_colors:
+            valid.add(8 + i)
+            removed[8 + i] = sum(1 << (8 * run_colors[0] + n) for n in range(i, i + 3))
+        elif all(any((color, n) in held for color in range(3)) for n in range(i, i + 3)):
+            valid.add(14 + i)
+            removed[14 + i] = sum(1 << (8 * min(c for c in range(3) if (c, n) in held) + n) for n in range(i, i + 3))
+    valid.update(20 + index for index in range(NUM_CARDS) if mask >> index & 1)
+    return valid, removed
+
+
+def test_hand_tables_cover_every_hand_once():
+    assert len(HAND_MASKS) == sum(comb(NUM_CARDS, k) for k in range(6))
+    assert (np.diff(HAND_MASKS) > 0).all()
+    assert all(HAND_ROWS[int(mask)] == row for row, mask in enumerate(HAND_MASKS))
+
+
+def test_hand_tables_match_rules():
+    rng = np.random.default_rng(0)
+    for row in rng.choice(len(HAND_MASKS), 3000, replace=False):
+        valid, removed = reference_actions(int(HAND_MASKS[row]))
+        assert set(np.flatnonzero(VALID_ACTION_MASKS[row])) == valid
+        for action, cards in removed.items():
+            assert REMOVED_CARDS[row, action] == cards
+
+
+def test_invalid_actions_are_rejected():
+    env = OkeyEnvironment(seed=0)
+    env.reset()
+    state = env.get_state()
+    invalid = np.flatnonzero(~env.valid_action_mask())
+    for action in (invalid[invalid < 20][0], invalid[invalid >= 20][0]):
+        with pytest.raises(ValueError):
+            env.step(int(action))
+    np.testing.assert_array_equal(env.get_state(), state)
+
+    vector_env = VectorOkeyEnvironment(4, seed=0)
+    vector_env.reset()
+    masks = vector_env.valid_action_mask()
+    actions = masks.argmax(axis=1)
+    actions[1] = np.flatnonzero(~masks[1])[-1]
+    with pytest.raises(ValueError):
+        vector_env.step(actions)
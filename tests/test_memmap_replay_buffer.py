@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from replay_buffer import MemmapReplayBuffer, ReplayBuffer, pack_transitions
+from test_replay_buffer import random_transitions
+
+
+def test_samples_like_the_in_memory_buffer(tmp_path):
+    records = pack_transitions(*random_transitions(150))
+    memmap = MemmapReplayBuffer(100, str(tmp_path / 'replay.mm'), seed=3, flush_interval=16)
+    in_memory = ReplayBuffer(100, seed=3)
+    for buffer in (memmap, in_memory):
+        buffer.add_records(records[:70])
+        buffer.add_records(records[70:])
+    np.testing.assert_array_equal(memmap.storage, in_memory.storage)
+    # The memmap buffer sorts its indices, a uniform minibatch in any order is the same sample
+    for expected, tensor in zip(in_memory.sample(32), memmap.sample(32)):
+        np.testing.assert_array_equal(np.sort(expected.numpy(), axis=0), np.sort(tensor.numpy(), axis=0))
+
+
+def test_records_survive_reopening(tmp_path):
+    path = str(tmp_path / 'replay.mm')
+    records = pack_transitions(*random_transitions(40))
+    writer = MemmapReplayBuffer(64, path)
+    writer.add_records(records)
+    writer.flush()
+
+    reader = MemmapReplayBuffer(64, path, readonly=True)
+    assert (reader.position, len(reader)) == (40, 40)
+    np.testing.assert_array_equal(reader.storage[:40], records)
+    with pytest.raises(ValueError):
+        reader.storage[0] = records[0]
+    with pytest.raises(ValueError):
+        MemmapReplayBuffer(32, path)
+
+
+def test_checkpoint_holds_only_the_ring_state(tmp_path):
+    path = str(tmp_path / 'replay.mm')
+    buffer = MemmapReplayBuffer(64, path, seed=0)
+    buffer.add_records(pack_transitions(*random_transitions(30)))
+    state = buffer.state_dict()
+    assert 'storage' not in state and state['position'] == 30
+    expected = buffer.sample(8)[1].numpy()
+
+    restored = MemmapReplayBuffer(64, path, seed=1)
+    restored.load_state_dict(state)
+    np.testing.assert_array_equal(restored.sample(8)[1].numpy(), expected)
+    with pytest.raises(ValueError):
+        MemmapReplayBuffer(64, str(tmp_path / 'other.mm')).load_state_dict(state)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from environment import OkeyEnvironment
+from nstep import NStepAccumulator, nstep_records
+from replay_buffer import TRANSITION_DTYPE, ReplayBuffer, pack_transitions, unpack_bits, upgrade_records
+
+GAMMA = 0.9
+
+
+def play_game(seed, max_steps=None):
+    # Single-step transitions of one random game, cut after max_steps when given
+    env = OkeyEnvironment(seed=seed)
+    rng = np.random.default_rng(seed)
+    state = env.reset()
+    steps = []
+    done = False
+    while not done and (max_steps is None or len(steps) < max_steps):
+        action = int(rng.choice(env.get_valid_actions()))
+        next_state, reward, done = env.step(action)
+        steps.append((state, action, reward, next_state, done, env.valid_action_mask()))
+        state = next_state
+    return [np.array(column) for column in zip(*steps)]
+
+
+def reference_records(game, n_step):
+    states, actions, rewards, next_states, dones, next_masks = game
+    length = len(actions)
+    steps = np.minimum(n_step, length - np.arange(length))
+    returns = [sum(GAMMA ** k * rewards[t + k] for k in range(steps[t])) for t in range(length)]
+    last = np.arange(length) + steps - 1
+    return pack_transitions(states, actions, returns, next_states[last], dones[last], next_masks[last], steps)
+
+
+def assert_records_equal(records, expected):
+    for name in ('state', 'next_state', 'next_mask', 'action', 'done', 'steps'):
+        np.testing.assert_array_equal(records[name], expected[name])
+    np.testing.assert_allclose(records['reward'], expected['reward'], rtol=1e-6)
+
+
+@pytest.mark.parametrize('n_step', [1, 3, 5])
+def test_accumulator_matches_reference(n_step):
+    game = play_game(0)
+    accumulator = NStepAccumulator(n_step, GAMMA)
+    records = [accumulator.add(*(column[t][None] for column in game)) for t in range(len(game[1]))]
+    records = np.concatenate(records)
+    assert_records_equal(records, reference_records(game, n_step))
+    # The game ended with done, nothing is left to flush and no transition bootstraps past the end
+    assert len(accumulator.flush()) == 0
+    assert records['done'][-min(n_step, len(records)):].all()
+
+
+@pytest.mark.parametrize('n_step', [1, 3, 5])
+def test_nstep_records_matches_reference(n_step):
+    games = [play_game(seed) for seed in range(4)]
+    single_step = np.concatenate([pack_transitions(*game) for game in games])
+    expected = np.concatenate([reference_records(game, n_step) for game in games])
+    assert_records_equal(nstep_records(single_step, n_step, GAMMA), expected)
+
+
+def test_flush_bootstraps_cut_games():
+    game = play_game(1, max_steps=6)
+    assert not game[4][-1]
+    accumulator = NStepAccumulator(4, GAMMA)
+    records = np.concatenate([accumulator.add(*(column[t][None] for column in game)) for t in range(6)]
+                             + [accumulator.flush()])
+    assert_records_equal(records, reference_records(game, 4))
+    assert not records['done'].any()
+    np.testing.assert_array_equal(unpack_bits(records['next_state'][-4:], 72), np.repeat(game[3][-1:], 4, axis=0))
+    assert_records_equal(nstep_records(pack_transitions(*game), 4, GAMMA), records)
+
+
+def test_lockstep_games_are_kept_apart():
+    games = [play_game(seed) for seed in (2, 3, 4)]
+    packed_states = [pack_transitions(*game)['state'] for game in games]
+    accumulator = NStepAccumulator(3, GAMMA, num_games=3)
+    per_game = {i: [] for i in range(3)}
+    for t in range(max(len(game[1]) for game in games)):
+        playing = [i for i in range(3) if t < len(games[i][1])]
+        step = [np.stack([games[i][column][t] for i in playing]) for column in range(6)]
+        # Games that already ended sit out, the records are matched back to their game by state
+        for record in accumulator.add(*step, games=playing):
+            owner = next(i for i in playing if (packed_states[i] == record['state']).all(axis=1).any())
+            per_game[owner].append(record)
+    for i, game in enumerate(games):
+        assert_records_equal(np.array(per_game[i]), reference_records(game, 3))
+
+
+def test_upgrade_records_from_old_checkpoints():
+    # Records written before n-step returns, integer rewards and no steps field
+    old_dtype = np.dtype([(name, TRANSITION_DTYPE[name]) for name in TRANSITION_DTYPE.names if name != 'steps'])
+    old_dtype = np.dtype([(name, np.int16 if name == 'reward' else old_dtype[name]) for name in old_dtype.names])
+    records = np.concatenate([pack_transitions(*play_game(seed)) for seed in range(3)])[:20]
+    old_records = np.zeros(20, dtype=old_dtype)
+    for name in old_dtype.names:
+        old_records[name] = records[name]
+
+    upgraded = upgrade_records(old_records)
+    assert upgraded.dtype == TRANSITION_DTYPE
+    np.testing.assert_array_equal(upgraded, records)
+
+    buffer = ReplayBuffer(32)
+    buffer.load_state_dict({'storage': old_records, 'position': 20, 'size': 20,
+                            'rng': np.random.default_rng(0).bit_generator.state})
+    np.testing.assert_array_equal(buffer.storage[:20], records)
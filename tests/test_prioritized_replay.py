@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from replay_buffer import PrioritizedReplayBuffer, SumTree, pack_transitions
+from test_replay_buffer import random_transitions
+
+
+def test_sum_tree_updates_and_finds():
+    tree = SumTree(5)
+    tree.update(np.arange(5), [1.0, 2.0, 3.0, 4.0, 0.0])
+    assert tree.total() == 10.0
+    np.testing.assert_array_equal(tree.find(np.array([0.5, 1.5, 3.0, 3.5, 9.9])), [0, 1, 1, 2, 3])
+    tree.update([3], [0.5])
+    assert tree.total() == 6.5
+    np.testing.assert_array_equal(tree.priorities(np.arange(5)), [1.0, 2.0, 3.0, 0.5, 0.0])
+
+
+def test_prioritized_sampling_is_proportional():
+    buffer = PrioritizedReplayBuffer(8, alpha=1.0, seed=0)
+    buffer.add_records(pack_transitions(*random_transitions(8)))
+    priorities = np.arange(1, 9, dtype=np.float64)
+    buffer.update_priorities(np.arange(8), priorities - buffer.priority_epsilon)
+    counts = np.zeros(8)
+    for _ in range(2000):
+        _, indices, _ = buffer.sample(16)
+        counts += np.bincount(indices, minlength=8)
+    np.testing.assert_allclose(counts / counts.sum(), priorities / priorities.sum(), atol=0.01)
+
+
+def test_prioritized_weights_and_priority_updates():
+    buffer = PrioritizedReplayBuffer(8, alpha=0.5, beta_start=1.0, seed=0)
+    buffer.add_records(pack_transitions(*random_transitions(8)))
+    # New transitions start at the largest priority seen so far
+    np.testing.assert_allclose(buffer.tree.priorities(np.arange(8)), 1.0)
+    buffer.update_priorities(np.array([2, 5]), np.array([3.0, -8.0]))
+    assert buffer.max_priority == pytest.approx(8.0 + buffer.priority_epsilon)
+    np.testing.assert_allclose(buffer.tree.priorities(np.array([2, 5])),
+                               (np.array([3.0, 8.0]) + buffer.priority_epsilon) ** 0.5)
+    buffer.add_records(pack_transitions(*random_transitions(1)))
+    assert buffer.tree.priorities(np.array([0]))[0] == pytest.approx(buffer.max_priority ** 0.5)
+
+    _, indices, weights = buffer.sample(8)
+    probabilities = buffer.tree.priorities(indices) / buffer.tree.total()
+    expected = 1 / (8 * probabilities)
+    np.testing.assert_allclose(weights.numpy(), expected / expected.max(), rtol=1e-5)
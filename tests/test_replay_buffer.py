@@ -0,0 +1,46 @@
+import numpy as np
+from replay_buffer import ACTION_SIZE, STATE_SIZE, TRANSITION_DTYPE, ReplayBuffer, pack_transitions
+
+
+def random_transitions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.random((count, STATE_SIZE)) < 0.3, rng.integers(0, ACTION_SIZE, count),
+            rng.integers(0, 10, count) * 10, rng.random((count, STATE_SIZE)) < 0.3, rng.random(count) < 0.1,
+            rng.random((count, ACTION_SIZE)) < 0.5)
+
+
+def test_gather_returns_what_was_added():
+    states, actions, rewards, next_states, dones, next_masks = random_transitions(10)
+    buffer = ReplayBuffer(16)
+    buffer.add_batch(states, actions, rewards, next_states, dones, next_masks)
+    batch = buffer.gather(np.arange(10))
+    for tensor, expected in zip(batch, (states, actions, rewards, next_states, dones, next_masks, np.ones(10))):
+        np.testing.assert_array_equal(tensor.numpy(), np.asarray(expected, dtype=tensor.numpy().dtype))
+
+
+def test_single_and_batched_adds_store_the_same_records():
+    transitions = random_transitions(10)
+    single, batched = ReplayBuffer(16), ReplayBuffer(16)
+    for transition in zip(*transitions):
+        single.add(transition)
+    batched.add_batch(*transitions)
+    assert TRANSITION_DTYPE.itemsize == 31
+    np.testing.assert_array_equal(single.storage, batched.storage)
+    assert (single.position, single.size) == (batched.position, batched.size) == (10, 10)
+
+
+def test_ring_overwrites_oldest():
+    buffer = ReplayBuffer(8)
+    buffer.add_records(pack_transitions(*random_transitions(12)))
+    assert len(buffer) == 8 and buffer.position == 4
+    np.testing.assert_array_equal(buffer.storage['action'][:4], random_transitions(12)[1][8:])
+
+
+def test_unseeded_sampling_follows_global_seed():
+    samples = []
+    for _ in range(2):
+        np.random.seed(5)
+        buffer = ReplayBuffer(100)
+        buffer.add_records(pack_transitions(*random_transitions(100)))
+        samples.append(buffer.sample(32)[1].numpy())
+    np.testing.assert_array_equal(samples[0], samples[1])
@@ -0,0 +1,53 @@
+import asyncio
+import numpy as np
+from server import AdvisoryServer
+
+
+class FirstValidPolicy:
+    # Lowest valid action, a combination whenever the hand has one
+    def act_batch(self, states, valid_masks):
+        return np.asarray(valid_masks).argmax(axis=1)
+
+
+def run_requests(*batches):
+    # Every batch of requests is sent concurrently, the batches one after another
+    async def run():
+        server = AdvisoryServer(FirstValidPolicy())
+        responses = []
+        for batch in batches:
+            responses.append(await asyncio.gather(*(server.handle(request) for request in batch)))
+        return responses
+    return asyncio.run(run())
+
+
+START = {'op': 'start', 'game': 'g', 'hand': ['r,1', 'r,2', 'r,3', 'y,5', 'b,7']}
+
+
+def test_suggest_then_play():
+    _, [suggestion], [played] = run_requests([START], [{'op': 'suggest', 'game': 'g'}],
+                                             [{'op': 'play', 'game': 'g', 'action': 8, 'draw': ['y,1', 'y,2', 'y,3']}])
+    assert suggestion == {'action': 8, 'cards': ['r,1', 'r,2', 'r,3'], 'points': 50, 'draw_next': 3}
+    assert played['points'] == 50 and played['total'] == 50 and not played['done']
+    assert sorted(played['hand']) == ['b,7', 'y,1', 'y,2', 'y,3', 'y,5']
+
+
+def test_concurrent_requests_on_one_game_run_in_order():
+    # The play arrives while the suggestion waits for its batch, the suggestion still describes the hand it saw
+    discard_r1 = 20
+    _, [suggestion, played] = run_requests([START], [{'op': 'suggest', 'game': 'g'},
+                                                     {'op': 'play', 'game': 'g', 'action': discard_r1,
+                                                      'draw': ['b,1']}])
+    assert suggestion == {'action': 8, 'cards': ['r,1', 'r,2', 'r,3'], 'points': 50, 'draw_next': 3}
+    assert sorted(played['hand']) == ['b,1', 'b,7', 'r,2', 'r,3', 'y,5']
+
+
+def test_rejected_play_leaves_the_game_unchanged():
+    async def run():
+        server = AdvisoryServer(FirstValidPolicy())
+        await server.handle(START)
+        lines = []
+        await server.respond('{"op": "play", "game": "g", "action": 0}', lines.append)
+        return lines, server.sessions['g'].env.hand
+    lines, hand = asyncio.run(run())
+    assert 'error' in lines[0]
+    assert sorted(hand) == [(0, 1), (0, 2), (0, 3), (1, 5), (2, 7)]
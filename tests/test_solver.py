@@ -0,0 +1,25 @@
+import random
+from solver import OptimalSolver, deck_mask_of, regret_report
+
+
+def test_regret_report_leaves_global_random_alone(tmp_path):
+    solver = OptimalSolver(str(tmp_path / 'table.npz'))
+    random.seed(7)
+    expected = [random.random() for _ in range(3)]
+    random.seed(7)
+    first = regret_report(lambda env, state, valid: min(valid), solver, num_games=3, max_deck_size=3, seed=1)
+    assert [random.random() for _ in range(3)] == expected
+    # The deals come from the seed alone
+    assert regret_report(lambda env, state, valid: min(valid), solver, num_games=3, max_deck_size=3, seed=1) == first
+
+
+def test_optimal_policy_has_no_regret(tmp_path):
+    solver = OptimalSolver(str(tmp_path / 'table.npz'))
+    def policy(env, state, valid):
+        # Optimal once the deck is small enough to be scored
+        if len(env.deck_cards) <= 3:
+            return solver.solve(env.hand_mask, deck_mask_of(env))[1]
+        return min(valid)
+
+    report = regret_report(policy, solver, num_games=3, max_deck_size=3)
+    assert report['moves'] > 0 and report['mean_regret'] < 1e-9
@@ -0,0 +1,24 @@
+import random
+import pytest
+from config import Config
+from sweep import DEFAULT_SEARCH_SPACE, check_search_space, rung_budgets, sample_params
+
+
+def test_unknown_fields_are_rejected():
+    check_search_space(DEFAULT_SEARCH_SPACE, Config())
+    with pytest.raises(ValueError, match='learning_rte'):
+        check_search_space({'learning_rte': {'choice': [1e-4]}}, Config())
+
+
+def test_sample_params_stays_in_range():
+    rng = random.Random(0)
+    for _ in range(100):
+        params = sample_params(DEFAULT_SEARCH_SPACE, rng)
+        assert 1e-5 <= params['learning_rate'] <= 1e-3
+        assert params['target_update'] in DEFAULT_SEARCH_SPACE['target_update']['choice']
+    with pytest.raises(ValueError):
+        sample_params({'learning_rate': {'normal': [0, 1]}}, rng)
+
+
+def test_rung_budgets():
+    assert rung_budgets(300, 10000, 3) == [300, 900, 2700, 8100]
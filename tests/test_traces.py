@@ -0,0 +1,93 @@
+import numpy as np
+from environment import OkeyEnvironment
+from replay_buffer import pack_transitions
+from traces import TraceWriter, chunk_transitions, iter_episodes, read_chunks, replay_episode, trace_stats
+
+
+def play_games(count, seed=0):
+    env = OkeyEnvironment(seed=seed)
+    rng = np.random.default_rng(seed)
+    games = []
+    for _ in range(count):
+        env.reset()
+        actions, rewards = [], []
+        done = False
+        while not done:
+            action = int(rng.choice(env.get_valid_actions()))
+            _, reward, done = env.step(action)
+            actions.append(action)
+            rewards.append(reward)
+        games.append((env.played_deal(), actions, rewards))
+    return games
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'games.okt')
+    games = play_games(25)
+    writer = TraceWriter(path, chunk_size=10)
+    for game in games:
+        writer.add_episode(*game)
+    writer.close()
+
+    assert len(list(read_chunks(path))) == 3
+    assert trace_stats(path)['episodes'] == 25
+    for (deal, actions, rewards), (read_deal, read_actions, read_rewards) in zip(games, iter_episodes(path)):
+        assert list(read_deal) == deal
+        assert list(read_actions) == actions
+        assert list(read_rewards) == rewards
+
+
+def test_truncated_chunk_is_ignored(tmp_path):
+    path = str(tmp_path / 'games.okt')
+    writer = TraceWriter(path, chunk_size=10)
+    for game in play_games(20):
+        writer.add_episode(*game)
+    writer.close()
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 5)
+    assert trace_stats(path)['episodes'] == 10
+
+
+def test_chunk_transitions_match_replay(tmp_path):
+    path = str(tmp_path / 'games.okt')
+    writer = TraceWriter(path)
+    for game in play_games(8, seed=1):
+        writer.add_episode(*game)
+    writer.close()
+
+    chunk = next(read_chunks(path))
+    replayed = [step for deal, actions, rewards in iter_episodes(path) for step in replay_episode(deal, actions, rewards)]
+    expected = pack_transitions(*[np.array(column) for column in zip(*replayed)])
+    np.testing.assert_array_equal(chunk_transitions(*chunk), expected)
+
+
+def test_tell_flushes_and_truncate_rewinds(tmp_path):
+    path = str(tmp_path / 'games.okt')
+    games = play_games(6)
+    writer = TraceWriter(path)
+    for game in games[:4]:
+        writer.add_episode(*game)
+    position = writer.tell()
+    assert trace_stats(path)['episodes'] == 4 and position == trace_stats(path)['bytes']
+    for game in games[4:]:
+        writer.add_episode(*game)
+    writer.flush()
+    writer.add_episode(*games[0])  # Still buffered, dropped as well
+    writer.truncate(position)
+    writer.close()
+    assert [list(actions) for _, actions, _ in iter_episodes(path)] == [actions for _, actions, _ in games[:4]]
+
+
+def test_resumed_training_rewinds_its_trace(tmp_path):
+    from test_checkpoint import train
+    train(tmp_path / 'first', 12, trace_path=str(tmp_path / 'first.okt'))
+    # A crash after episode 12, resumed from the checkpoint of episode 5: the trace already holds the
+    # games 5-11 that are played again
+    train(tmp_path / 'first', 12, str(tmp_path / 'first' / 'checkpoint_00000005.pt'),
+          trace_path=str(tmp_path / 'first.okt'))
+    train(tmp_path / 'second', 12, trace_path=str(tmp_path / 'second.okt'))
+    resumed = list(iter_episodes(str(tmp_path / 'first.okt')))
+    uninterrupted = list(iter_episodes(str(tmp_path / 'second.okt')))
+    assert len(resumed) == len(uninterrupted) == 12
+    for (deal, actions, _), (expected_deal, expected_actions, _) in zip(resumed, uninterrupted):
+        assert list(deal) == list(expected_deal) and list(actions) == list(expected_actions)
@@ -0,0 +1,31 @@
+import random
+import numpy as np
+from environment import OkeyEnvironment
+from hand_tables import NUM_CARDS
+from vector_environment import VectorOkeyEnvironment
+
+
+def test_scalar_and_vector_environments_agree():
+    num_games = 64
+    rng = np.random.default_rng(1)
+    deals = np.array([rng.permutation(NUM_CARDS) for _ in range(num_games)])
+    scalar_envs = [OkeyEnvironment() for _ in range(num_games)]
+    scalar_states = np.array([env.reset(deal) for env, deal in zip(scalar_envs, deals)])
+    vector_env = VectorOkeyEnvironment(num_games, seed=0)
+    np.testing.assert_array_equal(vector_env.reset(deals), scalar_states)
+
+    player = random.Random(2)
+    playing = np.ones(num_games, dtype=bool)
+    while playing.any():
+        # Finished games are reset by the vector environment, they keep playing its first legal action
+        actions = vector_env.valid_action_mask().argmax(axis=1)
+        np.testing.assert_array_equal(vector_env.valid_action_mask()[playing],
+                                      [scalar_envs[i].valid_action_mask() for i in np.flatnonzero(playing)])
+        for i in np.flatnonzero(playing):
+            actions[i] = player.choice(scalar_envs[i].get_valid_actions())
+        states, rewards, dones = vector_env.step(actions)
+        for i in np.flatnonzero(playing):
+            state, reward, done = scalar_envs[i].step(int(actions[i]))
+            assert rewards[i] == reward and dones[i] == done
+            np.testing.assert_array_equal(vector_env.terminal_states[i] if done else states[i], state)
+            playing[i] = not done
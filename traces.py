@@ -0,0 +1,183 @@
+import os
+import struct
+import numpy as np
+from environment import OkeyEnvironment
+from hand_tables import NUM_CARDS, VALID_ACTION_MASKS, hand_rows
+from nstep import nstep_records
+from replay_buffer import pack_transitions
+from vector_environment import VectorOkeyEnvironment
+
+# Episode traces: a game is its deal (24 card indices in deck order, see OkeyEnvironment.reset)
+# plus one action byte and one reward byte per step, observations are rebuilt by replaying it.
+# A trace file is a sequence of append-only chunks, each one a header followed by column blocks:
+#   header  b'OKTR', version u8, num_episodes u32, num_steps u32
+#   deals   num_episodes x 24 u8
+#   lengths num_episodes u8
+#   actions num_steps u8
+#   rewards num_steps u8, points / 10
+# A chunk cut short by a crash is ignored when reading.
+
+MAGIC = b'OKTR'
+VERSION = 1
+HEADER = struct.Struct('<4sBII')
+REWARD_UNIT = 10  # Every reward is a multiple of 10 points
+
+
+class TraceWriter:
+    def __init__(self, path, chunk_size=4096):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.deals, self.lengths, self.actions, self.rewards = [], [], [], []
+
+    def add_episode(self, deal, actions, rewards):
+        self.deals.append(deal)
+        self.lengths.append(len(actions))
+        self.actions.extend(actions)
+        self.rewards.extend(rewards)
+        if len(self.deals) >= self.chunk_size:
+            self.flush()
+
+    def add_episodes(self, deals, lengths, actions, rewards):
+        # Columns of many episodes at once, actions and rewards concatenated in episode order
+        self.flush()
+        self._write_chunk(deals, lengths, actions, rewards)
+
+    def flush(self):
+        if self.deals:
+            self._write_chunk(self.deals, self.lengths, self.actions, self.rewards)
+            self.deals, self.lengths, self.actions, self.rewards = [], [], [], []
+
+    def _write_chunk(self, deals, lengths, actions, rewards):
+        rewards = np.asarray(rewards, dtype=np.int64)
+        if (rewards % REWARD_UNIT).any() or (rewards < 0).any() or (rewards >= 256 * REWARD_UNIT).any():
+            raise ValueError("Rewards must be multiples of 10 points below 2560")
+        blocks = [
+            np.asarray(deals, dtype=np.uint8).reshape(-1, NUM_CARDS),
+            np.asarray(lengths, dtype=np.uint8),
+            np.asarray(actions, dtype=np.uint8),
+            (rewards // REWARD_UNIT).astype(np.uint8),
+        ]
+        with open(self.path, 'ab') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(blocks[0]), len(blocks[2])))
+            for block in blocks:
+                f.write(block.tobytes())
+
+    def tell(self):
+        # Size of the file with every buffered episode written, the position a checkpoint resumes from
+        self.flush()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self, position):
+        # Drops the episodes written after position, e.g. the games played after a resumed checkpoint
+        self.deals, self.lengths, self.actions, self.rewards = [], [], [], []
+        if os.path.exists(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(position)
+
+    def close(self):
+        self.flush()
+
+
+def read_chunks(path):
+    # Yields (deals, lengths, actions, rewards) per chunk, one chunk in memory at a time
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            magic, version, num_episodes, num_steps = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} trace file")
+            payload = f.read(num_episodes * (NUM_CARDS + 1) + 2 * num_steps)
+            if len(payload) < num_episodes * (NUM_CARDS + 1) + 2 * num_steps:
+                return
+            data = np.frombuffer(payload, dtype=np.uint8)
+            deals = data[:num_episodes * NUM_CARDS].reshape(num_episodes, NUM_CARDS)
+            lengths = data[num_episodes * NUM_CARDS:num_episodes * (NUM_CARDS + 1)]
+            actions = data[num_episodes * (NUM_CARDS + 1):num_episodes * (NUM_CARDS + 1) + num_steps]
+            rewards = data[num_episodes * (NUM_CARDS + 1) + num_steps:].astype(np.int64) * REWARD_UNIT
+            yield deals, lengths, actions, rewards
+
+
+def iter_episodes(path):
+    # (deal, actions, rewards) of every recorded game
+    for deals, lengths, actions, rewards in read_chunks(path):
+        ends = np.cumsum(lengths)
+        for deal, start, end in zip(deals, ends - lengths, ends):
+            yield deal, actions[start:end], rewards[start:end]
+
+
+def replay_episode(deal, actions, rewards=None, env=None):
+    # Rebuilds the transitions of one game through OkeyEnvironment.step,
+    # (state, action, reward, next_state, done, next_valid_mask) per step
+    env = env or OkeyEnvironment()
+    state = env.reset(deal)
+    for t, action in enumerate(actions):
+        next_state, reward, done = env.step(int(action))
+        if rewards is not None and reward != rewards[t]:
+            raise ValueError(f"Step {t} scored {reward} points, the trace recorded {rewards[t]}")
+        yield state, int(action), reward, next_state, done, env.valid_action_mask()
+        state = next_state
+
+
+def chunk_transitions(deals, lengths, actions, rewards):
+    # Batched reconstruction of a whole chunk in a VectorOkeyEnvironment, packed transition records in
+    # episode order, ready for ReplayBuffer.add_records
+    lengths = lengths.astype(np.int64)
+    starts = np.cumsum(lengths) - lengths
+    num_steps = int(lengths.sum())
+    states = np.zeros((num_steps, 72), dtype=np.float32)
+    next_states = np.zeros((num_steps, 72), dtype=np.float32)
+    next_masks = np.zeros((num_steps, 44), dtype=bool)
+    dones = np.zeros(num_steps, dtype=bool)
+
+    env = VectorOkeyEnvironment(len(deals))
+    current_states = env.reset(deals)
+    for t in range(int(lengths.max(initial=0))):
+        rows = np.nonzero(lengths > t)[0]
+        positions = starts[rows] + t
+        # Finished games keep playing their first legal action, those steps are dropped
+        step_actions = env.valid_action_mask().argmax(axis=1)
+        step_actions[rows] = actions[positions]
+        next_current_states, step_rewards, step_dones = env.step(step_actions)
+        if (step_rewards[rows] != rewards[positions]).any() or (step_dones[rows] != (lengths[rows] == t + 1)).any():
+            raise ValueError("The trace does not match the environment rules")
+
+        states[positions] = current_states[rows]
+        done_rows = rows[step_dones[rows]]
+        live_rows = rows[~step_dones[rows]]
+        next_states[starts[live_rows] + t] = next_current_states[live_rows]
+        next_states[starts[done_rows] + t] = env.terminal_states[done_rows]
+        next_masks[starts[live_rows] + t] = VALID_ACTION_MASKS[hand_rows(env.hands[live_rows])]
+        next_masks[starts[done_rows] + t] = VALID_ACTION_MASKS[hand_rows(env.terminal_hands[done_rows])]
+        dones[positions] = step_dones[rows]
+        current_states = next_current_states
+    return pack_transitions(states, actions, rewards, next_states, dones, next_masks)
+
+
+def iter_transition_records(path, n_step=1, gamma=0.99):
+    # Streams the transitions of a trace file chunk by chunk, n_step transitions as in nstep.py. A chunk
+    # only holds whole games, so its n-step returns are complete.
+    for chunk in read_chunks(path):
+        yield nstep_records(chunk_transitions(*chunk), n_step, gamma)
+
+
+def load_replay_buffer(path, replay_buffer, max_transitions=None, n_step=1, gamma=0.99):
+    # Fills a replay buffer from a trace file without holding more than one chunk of transitions
+    added = 0
+    for records in iter_transition_records(path, n_step, gamma):
+        if max_transitions is not None:
+            records = records[:max_transitions - added]
+        replay_buffer.add_records(records)
+        added += len(records)
+        if max_transitions is not None and added >= max_transitions:
+            break
+    return added
+
+
+def trace_stats(path):
+    num_episodes = num_steps = 0
+    for deals, lengths, _, _ in read_chunks(path):
+        num_episodes += len(deals)
+        num_steps += int(lengths.sum())
+    return {'episodes': num_episodes, 'steps': num_steps, 'bytes': os.path.getsize(path)}
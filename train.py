@@ -1,54 +1,141 @@
 import torch
 import torch.optim as optim
-from collections import deque
-import random
 import numpy as np
+from checkpoint import CheckpointWriter, load_checkpoint, make_checkpoint, restore_checkpoint
+from nstep import NStepAccumulator
+from pretrain import pretrain_agent
+from replay_buffer import ReplayBuffer, MemmapReplayBuffer, PrioritizedReplayBuffer
+from telemetry import Telemetry
+from traces import TraceWriter
 from utils import preprocess_state
 
-def train_agent(env, agent, config):
+def make_replay_buffer(config):
+    if config.prioritized_replay:
+        if not config.batched_replay:
+            raise ValueError("prioritized_replay needs batched_replay")
+        if config.replay_memmap_path:
+            raise ValueError("prioritized_replay keeps its records in RAM, unset replay_memmap_path")
+        return PrioritizedReplayBuffer(config.buffer_size, config.priority_alpha, config.priority_beta_start,
+                                       config.priority_beta_steps, seed=config.replay_seed)
+    if config.replay_memmap_path:
+        return MemmapReplayBuffer(config.buffer_size, config.replay_memmap_path, seed=config.replay_seed)
+    return ReplayBuffer(config.buffer_size, seed=config.replay_seed)
+
+
+TRAIN_PHASES = ('valid_actions', 'act', 'env_step', 'buffer_add', 'sample', 'replay')
+
+
+def learn(agent, replay_buffer, optimizer, criterion, config, telemetry):
+    # One replay update from a sampled minibatch
+    clock = telemetry.clock()
+    if config.prioritized_replay:
+        minibatch, indices, weights = replay_buffer.sample(config.batch_size)
+        clock = telemetry.lap('sample', clock)
+        td_errors = agent.replay(minibatch, optimizer, criterion, weights)
+        replay_buffer.update_priorities(indices, td_errors)
+    else:
+        minibatch = replay_buffer.sample(config.batch_size)
+        clock = telemetry.lap('sample', clock)
+        agent.replay(minibatch, optimizer, criterion)
+    telemetry.lap('replay', clock)
+    telemetry.count('updates')
+
+
+def train_agent(env, agent, config, resume_from=None):
+    if config.num_workers > 0:
+        if resume_from is not None:
+            raise ValueError("Resuming is only supported with num_workers=0")
+        from actor_learner import train_agent_distributed
+        return train_agent_distributed(env, agent, config)
+
     scores = []
-    replay_buffer = deque(maxlen=config.buffer_size)
+    replay_buffer = make_replay_buffer(config)
+    # Single-step transitions go straight into the buffer, the accumulator is only needed for n_step > 1
+    accumulator = NStepAccumulator(config.n_step, config.gamma) if config.n_step > 1 else None
     optimizer = optim.Adam(agent.model.parameters(), lr=config.learning_rate)
     criterion = torch.nn.MSELoss()
-    latest_100_scores = []
+    telemetry = Telemetry(config, TRAIN_PHASES, append=resume_from is not None)
     # Introduce a learning rate scheduler for decaying learning rate
-    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=1, gamma=1) # TODO This field shall be tuned
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=1, gamma=config.lr_decay)
 
-    for episode in range(config.num_episodes):
+    start_episode = 0
+    if config.pretrain and resume_from is None:
+        pretrain_agent(agent, replay_buffer, optimizer, config)
+    trace_writer = TraceWriter(config.trace_path) if config.trace_path else None
+    if resume_from is not None:
+        checkpoint = load_checkpoint(resume_from)
+        start_episode, scores = restore_checkpoint(checkpoint, agent, optimizer, scheduler, replay_buffer)
+        if trace_writer is not None and 'trace_position' in checkpoint:
+            trace_writer.truncate(checkpoint['trace_position'])  # Games after the checkpoint are played again
+        print(f"Resuming from {resume_from} at episode {start_episode}")
+    checkpoint_writer = CheckpointWriter(config.checkpoint_dir, config.checkpoint_keep) \
+        if config.checkpoint_interval else None
+
+    for episode in range(start_episode, config.num_episodes):
+        telemetry.begin_episode(episode)
         state = preprocess_state(env.reset())
+        valid_mask = env.valid_action_mask()
         total_reward = 0
+        episode_actions, episode_rewards = [], []
 
         for t in range(config.max_steps_per_episode):
-            valid_actions = env.get_valid_actions()
-            action = agent.act(state, valid_actions)
+            clock = telemetry.clock()
+            action = agent.act(state, valid_mask)
+            clock = telemetry.lap('act', clock)
             next_state, reward, done = env.step(action)
             next_state = preprocess_state(next_state)
-            replay_buffer.append((state, action, reward, next_state, done))
-            
+            clock = telemetry.lap('env_step', clock)
+            next_mask = env.valid_action_mask()
+            clock = telemetry.lap('valid_actions', clock)
+            if accumulator is None:
+                replay_buffer.add((state, action, reward, next_state, done, next_mask))
+            else:
+                records = accumulator.add(state[None], action, reward, next_state[None], done, next_mask[None])
+                if len(records):
+                    replay_buffer.add_records(records)
+            telemetry.lap('buffer_add', clock)
+            telemetry.count('env_steps')
+
             if len(replay_buffer) > config.batch_size:
-                minibatch = random.sample(replay_buffer, config.batch_size)
-                agent.replay(minibatch, optimizer, criterion)
+                learn(agent, replay_buffer, optimizer, criterion, config, telemetry)
 
-            state = next_state
+            state, valid_mask = next_state, next_mask
             total_reward += reward
+            episode_actions.append(action)
+            episode_rewards.append(reward)
 
 
             if done:
                 break
+        if accumulator is not None and not done:
+            replay_buffer.add_records(accumulator.flush())  # Cut off by max_steps_per_episode
 
         scores.append(total_reward)
+        if trace_writer is not None:
+            trace_writer.add_episode(env.played_deal(), episode_actions, episode_rewards)
         if episode % config.target_update == 0:
             agent.update_target_network()
         
         if agent.epsilon > agent.epsilon_min:
             agent.epsilon *= agent.epsilon_decay
-        
-        latest_100_scores.append(total_reward)
-        if episode % 100 == 0 and episode > 0:
-            print(f"{episode}, {np.mean(latest_100_scores).round(2)}")
-            latest_100_scores = []
-    
-        print(f"Episode {episode}/{config.num_episodes}, Total Reward: {total_reward} epsilon: {agent.epsilon}")
+        if len(replay_buffer) > config.batch_size:
+            scheduler.step()  # Only once updates have started, torch expects optimizer.step() first
+
+        telemetry.gauge('epsilon', agent.epsilon)
+        telemetry.gauge('loss', agent.last_loss)
+        telemetry.gauge('buffer_fill', len(replay_buffer) / config.buffer_size)
+        telemetry.end_episode(episode, total_reward)
+
+        if checkpoint_writer is not None and (episode + 1) % config.checkpoint_interval == 0:
+            trace_position = trace_writer.tell() if trace_writer is not None else None
+            checkpoint_writer.save(make_checkpoint(agent, optimizer, scheduler, replay_buffer, episode + 1, scores,
+                                                   config.checkpoint_replay_buffer, trace_position))
+    telemetry.close(config.num_episodes - 1)
+    replay_buffer.flush()
+    if trace_writer is not None:
+        trace_writer.close()
+    if checkpoint_writer is not None:
+        checkpoint_writer.close()
     torch.save(agent.model.state_dict(), config.model_save_path)
 
     print(f"Average reward: {np.mean(scores)}")
@@ -61,4 +148,4 @@ def train_agent(env, agent, config):
     print("Action Q-values:")
     for i in range(len(q_values)):
         print(f"Action {i}: {q_values[i]}")
-
+    return scores
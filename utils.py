@@ -1,4 +1,5 @@
 import numpy as np
 
 def preprocess_state(state):
-    return np.array(state).flatten()
+    # No copy for the flat arrays returned by the environment
+    return np.asarray(state).reshape(-1)
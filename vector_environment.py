@@ -0,0 +1,100 @@
+import numpy as np
+from environment import OkeyEnvironment
+from hand_tables import (
+    NUM_CARDS, HAND_SIZE, VALID_ACTION_MASKS, COMBINATION_BITS, REMOVED_CARDS, SAME_NUMBER_OR_COLOR_BITS,
+    hand_rows,
+)
+
+# Card locations, in the same order as the last axis of OkeyEnvironment.get_state
+IN_DECK, IN_HAND, DISCARDED = 0, 1, 2
+
+# Points for every action, taken from the scalar environment so both stay in sync
+ACTION_REWARDS = np.array([
+    OkeyEnvironment.calculate_reward_for_action(None, action, same_color=action < 14)
+    for action in range(44)
+], dtype=np.int64)
+
+CARD_BITS = 1 << np.arange(NUM_CARDS)
+
+
+class VectorOkeyEnvironment:
+    # Runs num_envs games in lockstep. Games that finish are reset automatically,
+    # their last observation and hand are kept in terminal_states and terminal_hands.
+    def __init__(self, num_envs, seed=None):
+        self.num_envs = num_envs
+        self.state_size = 72
+        self.action_size = 44
+        self.rng = np.random.default_rng(seed)
+        self.hands = np.zeros(num_envs, dtype=np.int64)  # 24-bit masks, see hand_tables
+        self.decks = np.zeros((num_envs, NUM_CARDS), dtype=np.int64)  # Cards are drawn from the end
+        self.deck_sizes = np.zeros(num_envs, dtype=np.int64)
+        self.locations = np.zeros((num_envs, NUM_CARDS), dtype=np.int64)
+        self.terminal_states = np.zeros((num_envs, self.state_size), dtype=np.float32)
+        self.terminal_hands = np.zeros(num_envs, dtype=np.int64)
+        self._rows = np.arange(num_envs)
+
+    def reset(self, deals=None):
+        # deals: optional (num_envs, 24) card ids in OkeyEnvironment.deck order
+        self._reset_envs(self._rows, deals)
+        return self.get_state()
+
+    def _reset_envs(self, rows, deals=None):
+        if deals is None:
+            deals = self.rng.permuted(np.tile(np.arange(NUM_CARDS), (len(rows), 1)), axis=1)
+        self.decks[rows] = deals
+        # Same as popping five cards off the end of the deck
+        hand_cards = self.decks[rows, -HAND_SIZE:]
+        self.hands[rows] = CARD_BITS[hand_cards].sum(axis=1)
+        self.deck_sizes[rows] = NUM_CARDS - HAND_SIZE
+        self.locations[rows] = IN_DECK
+        self.locations[rows[:, None], hand_cards] = IN_HAND
+
+    def get_state(self):
+        state = self.locations[:, :, None] == np.arange(3)
+        return state.reshape(self.num_envs, self.state_size).astype(np.float32)
+
+    def valid_action_mask(self):
+        return VALID_ACTION_MASKS[hand_rows(self.hands)]
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = hand_rows(self.hands)
+        valid = VALID_ACTION_MASKS[rows, actions]
+        if np.any(~valid):
+            raise ValueError(f"Actions {actions[~valid]} of games {np.flatnonzero(~valid)} are not valid for their hands")
+        rewards = ACTION_REWARDS[actions]
+
+        # Combinations remove the cards given by the lookup table, discards a single card
+        is_combination = actions < 20
+        removed = np.where(
+            is_combination,
+            REMOVED_CARDS[rows, np.where(is_combination, actions, 0)],
+            CARD_BITS[np.maximum(actions - 20, 0)])
+        self.hands &= ~removed
+        self.locations[(removed[:, None] & CARD_BITS) != 0] = DISCARDED
+
+        # Draw up to 3 cards after a combination and 1 after a discard
+        num_cards_to_draw = np.minimum(np.where(is_combination, 3, 1), self.deck_sizes)
+        for k in range(3):
+            rows = np.nonzero(num_cards_to_draw > k)[0]
+            new_cards = self.decks[rows, self.deck_sizes[rows] - 1 - k]
+            self.hands[rows] |= CARD_BITS[new_cards]
+            self.locations[rows, new_cards] = IN_HAND
+        self.deck_sizes -= num_cards_to_draw
+
+        dones = self.check_if_done()
+        states = self.get_state()
+        finished = np.nonzero(dones)[0]
+        if len(finished):
+            self.terminal_states[finished] = states[finished]
+            self.terminal_hands[finished] = self.hands[finished]
+            self._reset_envs(finished)
+            states[finished] = self.get_state()[finished]
+        return states, rewards, dones
+
+    def has_valid_combination(self):
+        # Same-number or same-color sequential combinations only
+        return (COMBINATION_BITS[hand_rows(self.hands)] & SAME_NUMBER_OR_COLOR_BITS) != 0
+
+    def check_if_done(self):
+        return ((self.deck_sizes == 0) & ~self.has_valid_combination()) | (self.hands == 0)